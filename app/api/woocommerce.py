@@ -1,20 +1,51 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
+from app.core.settings import get_settings
+from app.services.catalog_cache import (
+    catalog_status,
+    lookup_stock_by_sku,
+    remove_product,
+    search_catalog,
+    semantic_search_catalog,
+    upsert_product,
+)
+from app.services.numeric_attributes import parse_numeric_filters
 from app.services.woocommerce import woocommerce_client
 
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
 router = APIRouter(
     prefix="/woocommerce",
     tags=["woocommerce"],
 )
 
+_PRODUCT_TOPICS = {"product.created", "product.updated", "product.restored", "product.deleted"}
+
+
+def _valid_signature(secret: str, body: bytes, signature: str) -> bool:
+    """
+    WooCommerce firma el body crudo: base64(HMAC-SHA256(secret, body)).
+    """
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    expected = base64.b64encode(digest).decode("ascii")
+    return hmac.compare_digest(expected, signature.strip())
+
 
 @router.get("/inventory/sku/{sku}")
 async def get_inventory_by_sku(sku: str) -> Dict[str, Any]:
     """
     Devuelve información básica de inventario para un SKU.
 
+    Se resuelve con el índice SKU del catálogo local (stock re-consultado si está viejo).
+
     Ejemplo de respuesta:
     {
       "id": 123,
@@ -25,10 +56,137 @@ async def get_inventory_by_sku(sku: str) -> Dict[str, Any]:
       "stock_status": "instock",
       "type": "simple"
     }
+
+    Los productos variables agregan "variations" (stock por opción) y un SKU de
+    variación devuelve esa variación con "parent_id" y "attributes".
     """
-    stock_info: Optional[Dict[str, Any]] = await woocommerce_client.get_stock_by_sku(sku)
+    stock_info: Optional[Dict[str, Any]] = await lookup_stock_by_sku(sku)
 
     if stock_info is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado para ese SKU")
 
     return stock_info
+
+
+@router.get("/catalog/status")
+async def get_catalog_status() -> Dict[str, Any]:
+    """
+    Estado del cache local del catálogo: antigüedad, duración del último refresco, etc.
+    """
+    return catalog_status()
+
+
+@router.get("/catalog/search")
+async def get_catalog_search(
+    q: str,
+    line: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = 10,
+) -> Dict[str, Any]:
+    """
+    Búsqueda en el catálogo local con el desglose del score BM25 de cada resultado
+    (para depurar el ranking). Las medidas de `q` ("1 a 1.5 HP", "220V") se aplican
+    como filtros numéricos, igual que en la búsqueda del bot.
+    """
+    numeric = parse_numeric_filters(q)
+    results = await search_catalog(
+        q,
+        line_hint=line,
+        limit=max(1, min(limit, 50)),
+        category=category,
+        numeric=numeric,
+        explain=True,
+    )
+    return {
+        "query": q,
+        "numeric_filters": {f.attr: f.describe() for f in numeric},
+        "results": [
+            {
+                "id": p.get("id"),
+                "name": p.get("name"),
+                "sku": p.get("sku"),
+                "score_breakdown": p.get("score_breakdown"),
+            }
+            for p in results
+        ],
+    }
+
+
+@router.get("/catalog/semantic")
+async def get_catalog_semantic(
+    q: str,
+    category: Optional[str] = None,
+    limit: int = 10,
+) -> Dict[str, Any]:
+    """
+    Vecinos más cercanos de `q` en el índice vectorial local (similitud coseno),
+    para revisar qué candidatos aporta a la búsqueda del bot.
+    """
+    results = await semantic_search_catalog(q, limit=max(1, min(limit, 50)), category=category)
+    return {
+        "query": q,
+        "results": [
+            {
+                "id": p.get("id"),
+                "name": p.get("name"),
+                "sku": p.get("sku"),
+                "semantic_score": p.get("semantic_score"),
+            }
+            for p in results
+        ],
+    }
+
+
+@router.get("/client/stats")
+async def get_client_stats() -> Dict[str, Any]:
+    """
+    Métricas del cliente WooCommerce (llamadas reales vs. agrupadas por single-flight).
+    """
+    return woocommerce_client.request_stats()
+
+
+@router.post("/webhook/products")
+async def woocommerce_product_webhook(request: Request) -> Dict[str, Any]:
+    """
+    Webhook de WooCommerce para product.created/updated/deleted.
+
+    - Verifica X-WC-Webhook-Signature con WOOCOMMERCE_WEBHOOK_SECRET.
+    - Parcha en memoria solo el producto afectado (catálogo + índice de tokens).
+    - El ping que Woo envía al crear el webhook (sin topic) se responde 200.
+    """
+    secret = settings.WOOCOMMERCE_WEBHOOK_SECRET
+    if not secret:
+        raise HTTPException(status_code=503, detail="Webhook de WooCommerce no configurado")
+
+    body = await request.body()
+    topic = (request.headers.get("X-WC-Webhook-Topic") or "").strip().lower()
+
+    if not topic:
+        # Ping de activación: body "webhook_id=N", sin firma.
+        return {"status": "ok", "ping": True}
+
+    signature = request.headers.get("X-WC-Webhook-Signature") or ""
+    if not signature or not _valid_signature(secret, body, signature):
+        logger.warning("Webhook de WooCommerce con firma inválida", extra={"topic": topic})
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    if topic not in _PRODUCT_TOPICS:
+        return {"status": "ignored", "topic": topic}
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(payload, dict) or not isinstance(payload.get("id"), int):
+        raise HTTPException(status_code=400, detail="Missing product id")
+
+    if topic == "product.deleted":
+        applied = remove_product(payload["id"])
+    else:
+        applied = upsert_product(payload)
+
+    logger.info(
+        "Webhook de WooCommerce aplicado al catálogo",
+        extra={"topic": topic, "product_id": payload["id"], "applied": applied},
+    )
+    return {"status": "ok", "topic": topic, "product_id": payload["id"], "applied": applied}
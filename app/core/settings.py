@@ -70,6 +70,133 @@ class Settings(BaseSettings):
         ...,
         description="Consumer Secret de la API REST de WooCommerce",
     )
+    WOOCOMMERCE_WEBHOOK_SECRET: Optional[str] = Field(
+        default=None,
+        description="Secret de los webhooks de producto de WooCommerce (firma HMAC-SHA256).",
+    )
+    WOOCOMMERCE_SEARCH_CACHE_TTL_SECONDS: float = Field(
+        300.0,
+        description="TTL (s) del cache de resultados de ?search= en WooCommerce (0 lo desactiva).",
+    )
+    WOOCOMMERCE_SEARCH_CACHE_MAX_ENTRIES: int = Field(
+        512,
+        description="Máximo de queries distintas en el cache LRU de ?search=.",
+    )
+    WOOCOMMERCE_HTTP2: bool = Field(
+        False,
+        description="Usa HTTP/2 contra WooCommerce (requiere el paquete 'h2').",
+    )
+    WOOCOMMERCE_MAX_CONNECTIONS: int = Field(
+        20,
+        description="Máximo de conexiones simultáneas del pool HTTP hacia WooCommerce.",
+    )
+    WOOCOMMERCE_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        10,
+        description="Conexiones keep-alive que se mantienen abiertas en el pool de WooCommerce.",
+    )
+    WOOCOMMERCE_KEEPALIVE_EXPIRY_SECONDS: float = Field(
+        30.0,
+        description="Segundos que una conexión ociosa permanece en el pool de WooCommerce.",
+    )
+    WOOCOMMERCE_TIMEOUT_SECONDS: float = Field(
+        10.0,
+        description="Timeout por petición a WooCommerce (lectura/escritura/pool).",
+    )
+    WOOCOMMERCE_CONNECT_TIMEOUT_SECONDS: float = Field(
+        5.0,
+        description="Timeout para abrir la conexión TCP/TLS con WooCommerce.",
+    )
+    WOOCOMMERCE_CRAWL_TIMEOUT_SECONDS: float = Field(
+        60.0,
+        description="Techo de timeout de las páginas del crawl del catálogo (breaker propio, separado del chat).",
+    )
+
+    # === Cache local del catálogo WooCommerce ===
+    CATALOG_REFRESH_INTERVAL_SECONDS: int = Field(
+        600,
+        description="Segundos entre refrescos incrementales del catálogo en segundo plano.",
+    )
+    CATALOG_FULL_SYNC_SECONDS: int = Field(
+        21600,
+        description="Segundos entre re-crawls completos del catálogo (detecta productos borrados).",
+    )
+    CATALOG_SKU_FRESHNESS_SECONDS: int = Field(
+        120,
+        description="Antigüedad máxima (s) del stock/precio cacheado antes de re-consultarlo en una búsqueda por SKU.",
+    )
+    CATALOG_VARIATIONS_ENABLED: bool = Field(
+        True,
+        description="Indexa las variaciones (stock por opción) de los productos variables junto con el catálogo.",
+    )
+    CATALOG_SNAPSHOT_ENABLED: bool = Field(
+        True,
+        description="Guarda el catálogo procesado en disco para arrancar en caliente tras un reinicio.",
+    )
+    CATALOG_SNAPSHOT_PATH: Optional[str] = Field(
+        default=None,
+        description="Ruta del snapshot comprimido del catálogo (default: app/domain/catalog_snapshot.json.gz).",
+    )
+    CATALOG_VECTOR_SCORING: bool = Field(
+        True,
+        description="Rankea el catálogo local con una matriz dispersa BM25 (requiere numpy y scipy instalados).",
+    )
+    CATALOG_SEMANTIC_SEARCH: bool = Field(
+        True,
+        description="Índice vectorial local (n-gramas hasheados) como generador de candidatos para consultas parafraseadas.",
+    )
+
+    # === Búsqueda de productos ===
+    PRODUCT_SEARCH_MODE: str = Field(
+        "woo_first",
+        description="woo_first (?search= de Woo en vivo, catálogo local de respaldo) o local_first (catálogo local primero, antes del plan de OpenAI).",
+    )
+    PRODUCT_SEARCH_LOCAL_MAX_AGE_SECONDS: float = Field(
+        3600.0,
+        description="En local_first, antigüedad máxima (s) del catálogo local antes de preferir Woo en vivo.",
+    )
+    PRODUCT_SEARCH_LOCAL_MIN_HITS: int = Field(
+        3,
+        description="En local_first, resultados locales mínimos para no consultar Woo en vivo.",
+    )
+    PRODUCT_SEARCH_WOO_CONCURRENCY: int = Field(
+        4,
+        description="Queries ?search= de Woo en vuelo a la vez dentro de una búsqueda del bot.",
+    )
+
+    # === Resiliencia de upstreams (circuit breaker + timeout adaptativo) ===
+    UPSTREAM_MIN_TIMEOUT_SECONDS: float = Field(
+        2.0,
+        description="Piso del timeout adaptativo por upstream (el techo es el timeout fijo de cada servicio).",
+    )
+    UPSTREAM_TIMEOUT_PERCENTILE: float = Field(
+        0.95,
+        description="Percentil de latencia observada usado para derivar el timeout adaptativo.",
+    )
+    UPSTREAM_TIMEOUT_MULTIPLIER: float = Field(
+        2.0,
+        description="Multiplicador aplicado al percentil de latencia para calcular el timeout.",
+    )
+    UPSTREAM_BREAKER_FAILURE_THRESHOLD: int = Field(
+        5,
+        description="Fallas (o llamadas lentas) consecutivas que abren el circuito de un upstream.",
+    )
+    UPSTREAM_BREAKER_OPEN_SECONDS: float = Field(
+        30.0,
+        description="Segundos que el circuito permanece abierto antes de dejar pasar una llamada de prueba.",
+    )
+
+    UPSTREAM_RETRY_MAX_ATTEMPTS: int = Field(
+        3,
+        description="Intentos totales (incluye el primero) ante 429/5xx/errores de red en WooCommerce y OpenAI.",
+    )
+    UPSTREAM_RETRY_BASE_DELAY_SECONDS: float = Field(
+        0.5,
+        description="Espera base del backoff exponencial con jitter entre reintentos.",
+    )
+    UPSTREAM_RETRY_MAX_DELAY_SECONDS: float = Field(
+        8.0,
+        description="Espera máxima entre reintentos; un Retry-After mayor que esto no se reintenta.",
+    )
 
     # === OpenAI (para después) ===
     OPENAI_API_KEY: Optional[str] = Field(
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Optional
+
 
 GENERAL_CATALOG_URL = "https://aquaintegral.co/"
 
@@ -13,3 +15,13 @@ CATALOG_URLS = {
     "piscinas": "https://aquaintegral.co/categoria-producto/piscinas/",
     "piscina": "https://aquaintegral.co/categoria-producto/piscinas/",
 }
+
+
+def catalog_category_slug(line: Optional[str]) -> Optional[str]:
+    """
+    Slug de la categoría WooCommerce de una línea de negocio (último tramo de su URL).
+    """
+    url = CATALOG_URLS.get((line or "").strip().lower())
+    if not url:
+        return None
+    return url.rstrip("/").rsplit("/", 1)[-1] or None
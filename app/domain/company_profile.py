@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-import re
-import unicodedata
 from typing import Optional
 
+from app.utils.text import normalize
+
 
 COMPANY_NAME = "Aqua Integral SAS"
 WEBSITE_URL = "https://aquaintegral.co/"
@@ -76,21 +76,10 @@ LINE_ALIASES = {
 }
 
 
-def _normalize(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"[^a-z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t)
-    return t
-
-
 def normalize_line_key(text: Optional[str]) -> Optional[str]:
     if not text:
         return None
-    norm = _normalize(text)
+    norm = normalize(text)
     if not norm:
         return None
     for alias, canonical in LINE_ALIASES.items():
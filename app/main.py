@@ -7,7 +7,11 @@ from app.core.settings import get_settings
 from app.api.woocommerce import router as woocommerce_router
 from app.api.twilio import router as twilio_router
 from app.api.whatsapp import router as whatsapp_router
+from app.services.catalog_cache import start_catalog_refresh_task, stop_catalog_refresh_task
 from app.services.idle_followup import start_idle_followup_task
+from app.services.product_search import search_path_stats
+from app.services.resilience import upstream_stats
+from app.services.woocommerce import woocommerce_client
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -25,8 +29,17 @@ app.include_router(twilio_router)
 
 @app.on_event("startup")
 async def _startup() -> None:
+    await woocommerce_client.startup()
+    start_catalog_refresh_task()
     start_idle_followup_task()
 
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    stop_catalog_refresh_task()
+    await woocommerce_client.aclose()
+
+
 # PNG 1x1 de relleno para iconos (placeholder)
 _PLACEHOLDER_PNG = (
     b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01"
@@ -60,6 +73,22 @@ async def health() -> dict:
     }
 
 
+@app.get("/health/upstreams", tags=["system"])
+async def health_upstreams() -> dict:
+    """
+    Estado del circuit breaker y timeout adaptativo de cada upstream externo.
+    """
+    return upstream_stats()
+
+
+@app.get("/health/search", tags=["system"])
+async def health_search() -> dict:
+    """
+    Modo de búsqueda de productos y cuántas respuestas sirvió cada camino (Woo / catálogo local).
+    """
+    return search_path_stats()
+
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon() -> Response:
     """
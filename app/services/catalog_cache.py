@@ -1,151 +1,1311 @@
 from __future__ import annotations
 
 import asyncio
+import dataclasses
+import gzip
+import json
+import logging
+import os
 import re
 import time
-import unicodedata
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from app.services.woocommerce import woocommerce_client
+from app.core.settings import get_settings
+from app.services.catalog_index import CatalogProduct, InvertedIndex, RangeIndex, TermCorrector
+from app.services.catalog_matrix import MATRIX_AVAILABLE, CatalogMatrix
+from app.services.catalog_vectors import VectorIndex
+from app.services.category_tree import category_tree
+from app.services.numeric_attributes import NumericFilter, product_numeric_attributes
+from app.services.query_synonyms import match_query
+from app.services.resilience import without_deadline
+from app.services.woocommerce import PRODUCT_FIELDS, project_product, stock_summary, woocommerce_client
+from app.utils.text import analyze, analyze_document, stem_all
 
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
-_CACHE_TTL_SECONDS = 60 * 10  # 10 min
+# Intervalo entre sincronizaciones incrementales (delta). Pasado este tiempo el cache se
+# considera "stale": se sigue sirviendo mientras el refresco corre en segundo plano.
+_CACHE_TTL_SECONDS = max(30, int(getattr(settings, "CATALOG_REFRESH_INTERVAL_SECONDS", 60 * 10)))
+# Re-crawl completo para detectar productos borrados.
+_FULL_SYNC_SECONDS = max(_CACHE_TTL_SECONDS, int(getattr(settings, "CATALOG_FULL_SYNC_SECONDS", 60 * 60 * 6)))
+_SNAPSHOT_ENABLED = bool(getattr(settings, "CATALOG_SNAPSHOT_ENABLED", True))
+_SNAPSHOT_PATH = Path(
+    getattr(settings, "CATALOG_SNAPSHOT_PATH", None)
+    or Path(__file__).resolve().parents[1] / "domain" / "catalog_snapshot.json.gz"
+)
+_SNAPSHOT_VERSION = 7
+# Antigüedad máxima del stock/precio cacheado antes de re-consultarlo en una búsqueda por SKU.
+_SKU_FRESHNESS_SECONDS = max(0, int(getattr(settings, "CATALOG_SKU_FRESHNESS_SECONDS", 120)))
+_DELTA_OVERLAP_SECONDS = 60  # solape del watermark para no perder cambios en el mismo segundo
 _MAX_PAGES = 30              # 30 * 100 = 3000 productos max (sobrado para 860)
 _PER_PAGE = 100
+_CRAWL_CONCURRENCY = 4       # páginas en vuelo a la vez contra WordPress
+_VARIATIONS_ENABLED = bool(getattr(settings, "CATALOG_VARIATIONS_ENABLED", True))
+# Ranking con matriz dispersa (numpy + scipy); sin esas dependencias se usa el índice invertido.
+_VECTOR_SCORING = MATRIX_AVAILABLE and bool(getattr(settings, "CATALOG_VECTOR_SCORING", True))
+# Índice vectorial local (n-gramas hasheados) para consultas parafraseadas.
+_SEMANTIC_ENABLED = bool(getattr(settings, "CATALOG_SEMANTIC_SEARCH", True))
 
 _lock = asyncio.Lock()
 _cache_updated_at: float = 0.0
-_cache_products: List[Dict[str, Any]] = []
-_cache_tokens_by_id: Dict[int, set[str]] = {}
+_cache_full_synced_at: float = 0.0
+_cache_watermark: Optional[str] = None  # max date_modified_gmt visto
+_cache_products: Dict[int, CatalogProduct] = {}
+_token_index = InvertedIndex()  # postings token -> ids con tf por campo (BM25)
+_corrector = TermCorrector()  # typos + prefijos sobre el vocabulario del índice
+_range_index = RangeIndex()  # medidas (HP, V, m3/h, BTU, litros, mca, fases) -> ids
+_matrix: Optional[CatalogMatrix] = None  # pesos BM25 producto x token (se rearma por _index_generation)
+_vectors: Optional[VectorIndex] = None  # vectores de n-gramas por producto (se rearma por _index_generation)
+_cache_ids_by_sku: Dict[str, int] = {}  # SKU normalizado -> id
+# Variaciones de productos variables: registro compacto (parent_id, SKU, atributos, precio, stock).
+_cache_variations: Dict[int, Dict[str, Any]] = {}
+_cache_variation_ids_by_parent: Dict[int, List[int]] = {}
+_cache_variation_ids_by_sku: Dict[str, int] = {}  # SKU normalizado -> id de variación
+_cache_variation_fetched_at: Dict[int, float] = {}
+# Se incrementa con cada cambio del contenido del catálogo; invalida los caches de búsqueda.
+_cache_generation: int = 0
+_index_generation: int = 0  # solo cambia si cambia el texto indexado (no con stock/precio)
+_derived_task: Optional[asyncio.Task] = None  # rearmado en segundo plano de matriz BM25 y vectores
+# Webhooks llegados durante un crawl completo: id -> producto "catalog" (None = borrado).
+# El crawl los reaplica antes del commit para no revertirlos con páginas más viejas.
+_sync_patches: Optional[Dict[int, Optional[Dict[str, Any]]]] = None
+
+_last_refresh_kind: Optional[str] = None  # "full" | "delta"
+_last_refresh_duration: Optional[float] = None
+_last_refresh_error: Optional[str] = None
+_refresh_task: Optional[asyncio.Task] = None
+_refresh_loop_task: Optional[asyncio.Task] = None
+_variation_tasks: set[asyncio.Task] = set()  # refrescos de variaciones disparados por webhooks
 
 
 def _now() -> float:
     return time.time()
 
 
-def _norm(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = "".join(
-        ch for ch in unicodedata.normalize("NFD", s)
-        if unicodedata.category(ch) != "Mn"
-    )
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def _tokenize(s: str) -> List[str]:
-    s = _norm(s)
-    parts = re.split(r"[^a-z0-9]+", s)
-    return [p for p in parts if len(p) >= 3]
-
-
-def _product_text(p: Dict[str, Any]) -> str:
-    name = p.get("name") or ""
-    short_desc = p.get("short_description") or ""
+def _product_fields(p: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Tokens por campo indexado (ver catalog_index.FIELD_WEIGHTS).
+    """
     cats = p.get("categories") or []
     cat_names = " ".join([c.get("name", "") for c in cats if isinstance(c, dict)])
-    return f"{name} {cat_names} {short_desc}"
+    return {
+        "name": analyze_document(p.get("name")),
+        "categories": analyze_document(cat_names),
+        "short_description": analyze_document(p.get("short_description")),
+    }
 
 
 def _expand_query_tokens(query: str, line_hint: Optional[str]) -> List[str]:
     """
     Expansión mínima (NO inventa): solo agrega tokens de búsqueda reales para cubrir términos genéricos.
     """
-    qn = _norm(query)
-    extra: List[str] = []
-
-    # filtración -> filtro/cartucho/arena/válvula
-    if "filtracion" in qn or "filtración" in query.lower() or "filtro" in qn:
-        extra += ["filtro", "filtros", "filtracion", "cartucho", "arena", "valvula"]
-
-    # producto químico piscina -> cloro/ph/alguicida/clarificador
-    if ("quimic" in qn or "químic" in query.lower()) and (line_hint == "piscinas" or "piscin" in qn):
-        extra += ["cloro", "ph", "alguicida", "clarificador", "reductor", "incrementador", "acidet"]
+    extra = match_query(query).expansions(line_hint)
 
     # si estás en piscinas, boost por tokens típicos del catálogo
     if line_hint == "piscinas":
-        extra += ["piscina", "piscinas"]
+        extra.append("piscina")
 
-    toks = _tokenize(query) + extra
-    # dedup
-    seen = set()
-    out: List[str] = []
-    for t in toks:
-        k = _norm(t)
-        if k and k not in seen:
-            seen.add(k)
-            out.append(k)
-    return out
+    # raíces sin duplicados (filtro/filtros/filtracion ya comparten "filtr")
+    return stem_all(list(analyze(query)) + extra)
 
 
-async def _refresh_catalog_if_needed() -> None:
-    global _cache_updated_at, _cache_products, _cache_tokens_by_id
+async def _fetch_variations_of(parent_id: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    page = 1
+    while page <= _MAX_PAGES:
+        batch, _, total_pages = await woocommerce_client.list_variations_page(
+            parent_id,
+            per_page=_PER_PAGE,
+            page=page,
+        )
+        rows.extend(batch)
+        if not batch or len(batch) < _PER_PAGE or (total_pages is not None and page >= total_pages):
+            break
+        page += 1
+    return rows
+
+
+async def _fetch_parent_variations(
+    parent_id: int,
+    sem: asyncio.Semaphore,
+) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+    """
+    Variaciones de un padre, acotado por `sem`. None si falla (se conservan las anteriores).
+    """
+    async with sem:
+        try:
+            return parent_id, await _fetch_variations_of(parent_id)
+        except Exception:
+            logger.warning("Catalog cache: no se pudieron traer variaciones", extra={"product_id": parent_id})
+            return parent_id, None
+
+
+def _apply_variation_results(results: List[Tuple[int, Optional[List[Dict[str, Any]]]]]) -> None:
+    fetched_at = _now()
+    for parent_id, rows in results:
+        if rows is not None:
+            _set_variations(parent_id, rows, fetched_at=fetched_at)
 
-    if _cache_products and (_now() - _cache_updated_at) < _CACHE_TTL_SECONDS:
+
+async def _fetch_categories() -> List[Dict[str, Any]]:
+    categories: List[Dict[str, Any]] = []
+    page = 1
+    while page <= _MAX_PAGES:
+        batch, _, total_pages = await woocommerce_client.list_categories_page(per_page=_PER_PAGE, page=page)
+        categories.extend(batch)
+        if not batch or len(batch) < _PER_PAGE or (total_pages is not None and page >= total_pages):
+            break
+        page += 1
+    return categories
+
+
+async def _refresh_categories() -> None:
+    """
+    Recarga el árbol de categorías. Si falla se conserva el anterior: el catálogo
+    de productos no depende de él para refrescarse.
+    """
+    try:
+        categories = await _fetch_categories()
+    except Exception:
+        logger.warning("Catalog cache: no se pudo refrescar el árbol de categorías", exc_info=True)
         return
+    if categories:
+        category_tree.replace(categories)
 
-    async with _lock:
-        if _cache_products and (_now() - _cache_updated_at) < _CACHE_TTL_SECONDS:
+
+def _max_modified(products: List[Dict[str, Any]], current: Optional[str]) -> Optional[str]:
+    watermark = current
+    for p in products:
+        modified = p.get("date_modified_gmt")
+        if isinstance(modified, str) and modified and (watermark is None or modified > watermark):
+            watermark = modified
+    return watermark
+
+
+def _delta_since(watermark: str) -> str:
+    try:
+        dt = datetime.fromisoformat(watermark)
+    except ValueError:
+        return watermark
+    return (dt - timedelta(seconds=_DELTA_OVERLAP_SECONDS)).isoformat()
+
+
+def _bump_generation(*, index: bool = True) -> None:
+    """
+    Marca un cambio en el catálogo (invalida el cache de búsquedas de Woo). Con
+    `index=False` (solo stock/precio) no se rearman las estructuras derivadas del texto.
+    """
+    global _cache_generation, _index_generation
+    _cache_generation += 1
+    woocommerce_client.search_cache.set_generation(_cache_generation)
+    if index:
+        _index_generation += 1
+        _schedule_derived_indexes()
+
+
+def _indexed_text(record: CatalogProduct) -> Tuple[Any, ...]:
+    # Lo que alimenta los índices de texto/medidas; stock, precio o SKU no cambian el ranking.
+    return (record.name, record.short_description, record.categories, record.attributes)
+
+
+def catalog_generation() -> int:
+    """
+    Generación actual del catálogo (cambia cuando cambia algún producto cacheado).
+    """
+    return _cache_generation
+
+
+def normalize_sku(sku: Any) -> str:
+    """
+    Normaliza un SKU para el índice: sin espacios, minúsculas y sin ceros a la izquierda
+    ("001005", "1005" y " 1005 " son el mismo SKU).
+    """
+    key = re.sub(r"\s+", "", str(sku or "")).lower()
+    return key.lstrip("0") or key
+
+
+def _index_product(p: Dict[str, Any]) -> None:
+    pid = p.get("id")
+    if not isinstance(pid, int):
+        return
+    previous = _cache_products.get(pid)
+    record = CatalogProduct.from_dict(p, fetched_at=_now())
+    if previous is not None and previous.to_dict() == record.to_dict():
+        # Sin cambios (p. ej. el solape del watermark en cada delta): no se re-indexa ni
+        # se cambia la generación, así el cache de búsquedas de Woo sigue valiendo.
+        previous.fetched_at = record.fetched_at
+        return
+    if previous is not None:
+        old_sku = normalize_sku(previous.sku)
+        if old_sku and _cache_ids_by_sku.get(old_sku) == pid:
+            _cache_ids_by_sku.pop(old_sku, None)
+    _cache_products[pid] = record
+    fields = _product_fields(p)
+    old_tokens = _token_index.doc_tokens(pid)
+    _token_index.add(pid, fields)
+    _prune_corrector(old_tokens)
+    _range_index.add(pid, product_numeric_attributes(p))
+    for tokens in fields.values():
+        for token in tokens:
+            _corrector.add(token)
+    sku = normalize_sku(record.sku)
+    if sku:
+        _cache_ids_by_sku[sku] = pid
+    if record.type != "variable":
+        _clear_variations(pid)
+    _bump_generation(index=previous is None or _indexed_text(previous) != _indexed_text(record))
+
+
+def _prune_corrector(tokens: List[str]) -> None:
+    # Sin esto, el corrector seguiría expandiendo consultas a raíces que ya no tiene ningún producto.
+    for token in tokens:
+        if not _token_index.df(token):
+            _corrector.discard(token)
+
+
+def _drop_product(pid: int) -> None:
+    record = _cache_products.pop(pid, None)
+    _clear_variations(pid)
+    old_tokens = _token_index.doc_tokens(pid)
+    _token_index.remove(pid)
+    _prune_corrector(old_tokens)
+    _range_index.remove(pid)
+    if record is not None:
+        sku = normalize_sku(record.sku)
+        if sku and _cache_ids_by_sku.get(sku) == pid:
+            _cache_ids_by_sku.pop(sku, None)
+        _bump_generation()
+
+
+def _compact_variation(v: Dict[str, Any], parent_id: int) -> Optional[Dict[str, Any]]:
+    vid = v.get("id")
+    if not isinstance(vid, int) or v.get("status", "publish") != "publish":
+        return None
+    raw_attributes = v.get("attributes") or []
+    attributes: Dict[str, str] = {}
+    if isinstance(raw_attributes, dict):
+        # registro ya compacto (snapshot)
+        attributes = {str(k): str(val) for k, val in raw_attributes.items()}
+    else:
+        for a in raw_attributes:
+            if isinstance(a, dict) and a.get("name") and a.get("option"):
+                attributes[str(a["name"])] = str(a["option"])
+    return {
+        "id": vid,
+        "parent_id": parent_id,
+        "sku": v.get("sku") or "",
+        "attributes": attributes,
+        "price": v.get("price"),
+        "regular_price": v.get("regular_price"),
+        "stock_status": v.get("stock_status"),
+        "stock_quantity": v.get("stock_quantity"),
+        "manage_stock": v.get("manage_stock"),
+    }
+
+
+def _drop_variation(vid: int) -> None:
+    record = _cache_variations.pop(vid, None)
+    _cache_variation_fetched_at.pop(vid, None)
+    if record is None:
+        return
+    sku = normalize_sku(record.get("sku"))
+    if sku and _cache_variation_ids_by_sku.get(sku) == vid:
+        _cache_variation_ids_by_sku.pop(sku, None)
+    siblings = _cache_variation_ids_by_parent.get(record["parent_id"])
+    if siblings is not None:
+        siblings[:] = [i for i in siblings if i != vid]
+        if not siblings:
+            _cache_variation_ids_by_parent.pop(record["parent_id"], None)
+
+
+def _index_variation(record: Dict[str, Any], *, fetched_at: float) -> None:
+    vid = record["id"]
+    _drop_variation(vid)
+    _cache_variations[vid] = record
+    _cache_variation_fetched_at[vid] = fetched_at
+    sku = normalize_sku(record.get("sku"))
+    if sku:
+        _cache_variation_ids_by_sku[sku] = vid
+    _cache_variation_ids_by_parent.setdefault(record["parent_id"], []).append(vid)
+
+
+def _clear_variations(parent_id: int) -> None:
+    for vid in list(_cache_variation_ids_by_parent.get(parent_id, [])):
+        _drop_variation(vid)
+
+
+def _set_variations(parent_id: int, rows: List[Dict[str, Any]], *, fetched_at: float) -> None:
+    """
+    Reemplaza las variaciones de un padre. `rows` puede venir de Woo o del snapshot.
+    """
+    _clear_variations(parent_id)
+    for v in rows:
+        record = _compact_variation(v, parent_id)
+        if record is not None:
+            _index_variation(record, fetched_at=fetched_at)
+
+
+def _prune_variations() -> None:
+    """
+    Retira variaciones cuyo padre ya no está en el cache o dejó de ser variable.
+    """
+    for parent_id in list(_cache_variation_ids_by_parent):
+        parent = _cache_products.get(parent_id)
+        if parent is None or parent.type != "variable":
+            _clear_variations(parent_id)
+
+
+class _IndexBuilder:
+    """
+    Arma las estructuras del cache de a poco, a medida que llegan las páginas.
+
+    Cada producto se guarda como CatalogProduct (proyección "catalog") y sus tokens
+    en un InvertedIndex nuevo; el payload crudo de la página se puede descartar en
+    cuanto se agrega. `commit` reemplaza de una vez el índice vigente.
+    """
+
+    def __init__(self) -> None:
+        self.products: Dict[int, CatalogProduct] = {}
+        self.index = InvertedIndex()
+        self.ranges = RangeIndex()
+        self.ids_by_sku: Dict[str, int] = {}
+        self.watermark: Optional[str] = None
+
+    def add(self, p: Any, *, tokens: Optional[Dict[str, List[str]]] = None) -> Optional[CatalogProduct]:
+        """
+        Agrega un producto; devuelve el registro compacto o None si se ignoró.
+        """
+        pid = p.get("id") if isinstance(p, dict) else None
+        # Si el catálogo cambia a mitad del crawl, un producto puede repetirse entre páginas.
+        if not isinstance(pid, int) or pid in self.products:
+            return None
+        record = CatalogProduct.from_dict(p)
+        self.products[pid] = record
+        self.index.add(pid, tokens if isinstance(tokens, dict) else _product_fields(p))
+        self.ranges.add(pid, product_numeric_attributes(p))
+        sku = normalize_sku(record.sku)
+        if sku:
+            self.ids_by_sku[sku] = pid
+        modified = record.date_modified_gmt
+        if isinstance(modified, str) and modified and (self.watermark is None or modified > self.watermark):
+            self.watermark = modified
+        return record
+
+    def discard(self, pid: int) -> None:
+        record = self.products.pop(pid, None)
+        if record is None:
             return
+        self.index.remove(pid)
+        self.ranges.remove(pid)
+        sku = normalize_sku(record.sku)
+        if sku and self.ids_by_sku.get(sku) == pid:
+            self.ids_by_sku.pop(sku, None)
+
+    def apply_patches(self, patches: Dict[int, Optional[Dict[str, Any]]]) -> None:
+        """
+        Reaplica los cambios de webhooks llegados durante el crawl: los borrados
+        siempre; las actualizaciones salvo que la página del crawl sea más nueva.
+        """
+        for pid, p in patches.items():
+            current = self.products.get(pid)
+            if p is not None and current is not None:
+                if (current.date_modified_gmt or "") > (p.get("date_modified_gmt") or ""):
+                    continue
+            self.discard(pid)
+            if p is not None:
+                self.add(p)
+
+    def commit(self, *, fetched_at: float, patches: Optional[Dict[int, Optional[Dict[str, Any]]]] = None) -> None:
+        global _cache_products, _token_index, _corrector, _range_index, _cache_ids_by_sku
+
+        if patches:
+            self.apply_patches(patches)
+        for record in self.products.values():
+            record.fetched_at = fetched_at
+        corrector = TermCorrector()
+        corrector.build(self.index.vocabulary())
+        _cache_products = self.products
+        _token_index = self.index
+        _corrector = corrector
+        _range_index = self.ranges
+        _cache_ids_by_sku = self.ids_by_sku
+        _bump_generation()
+
+
+def _replace_catalog(
+    products: List[Dict[str, Any]],
+    *,
+    fetched_at: float,
+    tokens: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Reemplaza de una vez todas las estructuras del cache (p. ej. desde el snapshot).
+    """
+    builder = _IndexBuilder()
+    for p in products:
+        pid = p.get("id") if isinstance(p, dict) else None
+        builder.add(p, tokens=tokens.get(str(pid)) if tokens else None)
+    builder.commit(fetched_at=fetched_at)
+
 
-        products: List[Dict[str, Any]] = []
-        page = 1
+async def _full_sync() -> None:
+    """
+    Re-crawl completo en streaming: cada página se indexa apenas llega (mientras las
+    demás siguen en vuelo) y las variaciones de cada producto variable se piden en
+    cuanto aparece, sin esperar al final del crawl.
+    """
+    global _cache_watermark, _cache_full_synced_at, _sync_patches
 
-        while page <= _MAX_PAGES:
-            batch = await woocommerce_client.list_products(per_page=_PER_PAGE, page=page)
-            if not batch:
-                break
+    builder = _IndexBuilder()
+    sem = asyncio.Semaphore(_CRAWL_CONCURRENCY)
+    variation_tasks: List[asyncio.Future] = []
+    _sync_patches = {}
+    try:
+        async for page in woocommerce_client.iter_catalog(
+            per_page=_PER_PAGE,
+            max_pages=_MAX_PAGES,
+            concurrency=_CRAWL_CONCURRENCY,
+        ):
+            for raw in page:
+                record = builder.add(raw)
+                if _VARIATIONS_ENABLED and record is not None and record.type == "variable":
+                    variation_tasks.append(asyncio.ensure_future(_fetch_parent_variations(record.id, sem)))
+            del page
+        results = await asyncio.gather(*variation_tasks)
+    except BaseException:
+        for task in variation_tasks:
+            task.cancel()
+        _sync_patches = None
+        raise
 
-            products.extend(batch)
+    builder.commit(fetched_at=_now(), patches=_sync_patches)
+    _sync_patches = None
+    _apply_variation_results(results)
+    _prune_variations()
+    _cache_watermark = builder.watermark
+    _cache_full_synced_at = _now()
 
-            if len(batch) < _PER_PAGE:
-                break
 
-            page += 1
+async def _delta_sync(watermark: str) -> None:
+    """
+    Pide solo los productos modificados desde el watermark y los fusiona en el cache.
+
+    Los que dejaron de estar publicados se retiran; los borrados definitivamente
+    solo se detectan en el re-crawl completo (_FULL_SYNC_SECONDS).
+    """
+    global _cache_watermark
 
-        tokens_by_id: Dict[int, set[str]] = {}
-        for p in products:
-            pid = p.get("id")
+    since = _delta_since(watermark)
+    new_watermark = _cache_watermark
+    variable_ids: List[int] = []
+    async for page in woocommerce_client.iter_catalog(
+        per_page=_PER_PAGE,
+        max_pages=_MAX_PAGES,
+        concurrency=_CRAWL_CONCURRENCY,
+        modified_after=since,
+    ):
+        for raw in page:
+            pid = raw.get("id")
             if not isinstance(pid, int):
                 continue
-            toks = set(_tokenize(_product_text(p)))
-            tokens_by_id[pid] = toks
+            if raw.get("status", "publish") == "publish":
+                product = project_product(raw, "catalog")
+                _index_product(product)
+                if product.get("type") == "variable":
+                    variable_ids.append(pid)
+            else:
+                _drop_product(pid)
+        new_watermark = _max_modified(page, new_watermark)
+        del page
+
+    if _VARIATIONS_ENABLED and variable_ids:
+        sem = asyncio.Semaphore(_CRAWL_CONCURRENCY)
+        _apply_variation_results(await asyncio.gather(*(_fetch_parent_variations(pid, sem) for pid in variable_ids)))
+
+    # El watermark avanza solo si el delta terminó completo.
+    _cache_watermark = new_watermark
+
+
+def _needs_full_sync() -> bool:
+    if not _cache_products or not _cache_watermark:
+        return True
+    return (_now() - _cache_full_synced_at) >= _FULL_SYNC_SECONDS
+
+
+def _is_fresh() -> bool:
+    return bool(_cache_products) and (_now() - _cache_updated_at) < _CACHE_TTL_SECONDS
+
+
+async def _refresh_catalog_if_needed() -> None:
+    global _cache_updated_at, _last_refresh_kind, _last_refresh_duration, _last_refresh_error
+
+    if _is_fresh():
+        return
 
-        _cache_products = products
-        _cache_tokens_by_id = tokens_by_id
+    async with _lock:
+        if _is_fresh():
+            return
+
+        kind = "full" if _needs_full_sync() else "delta"
+        started = time.perf_counter()
+        try:
+            if kind == "full":
+                await _full_sync()
+            else:
+                await _delta_sync(_cache_watermark or "")
+            await _refresh_categories()
+        except Exception as exc:
+            _last_refresh_error = f"{type(exc).__name__}: {exc}"
+            raise
+        _last_refresh_kind = kind
+        _last_refresh_duration = time.perf_counter() - started
+        _last_refresh_error = None
         _cache_updated_at = _now()
 
+        if _SNAPSHOT_ENABLED:
+            try:
+                await asyncio.to_thread(_write_snapshot, _snapshot_payload())
+            except Exception:
+                logger.exception("Catalog cache: no se pudo guardar el snapshot", extra={"path": str(_SNAPSHOT_PATH)})
+
+
+def _snapshot_payload() -> Dict[str, Any]:
+    # Se arma en el event loop (copias de referencias); la compresión y escritura van en un hilo.
+    return {
+        "version": _SNAPSHOT_VERSION,
+        "saved_at": _now(),
+        "full_synced_at": _cache_full_synced_at,
+        "watermark": _cache_watermark,
+        "products": [record.to_dict() for record in _cache_products.values()],
+        "tokens": {str(pid): _token_index.fields(pid) for pid in _cache_products},
+        "variations": list(_cache_variations.values()),
+        "categories": category_tree.all(),
+    }
+
+
+def _write_snapshot(payload: Dict[str, Any]) -> None:
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    _SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _SNAPSHOT_PATH.with_name(_SNAPSHOT_PATH.name + ".tmp")
+    with gzip.open(tmp, "wb", compresslevel=6) as f:
+        f.write(raw)
+    os.replace(tmp, _SNAPSHOT_PATH)
+
+
+def load_catalog_snapshot() -> bool:
+    """
+    Carga el último snapshot en disco (si existe) y lo marca como stale.
+
+    Así la primera búsqueda tras un reinicio se responde desde memoria mientras el
+    refresco en segundo plano trae los cambios (delta si el full sync es reciente).
+    """
+    global _cache_watermark, _cache_full_synced_at, _cache_updated_at
+
+    if not _SNAPSHOT_ENABLED or _cache_products or not _SNAPSHOT_PATH.exists():
+        return False
+    try:
+        with gzip.open(_SNAPSHOT_PATH, "rb") as f:
+            data = json.loads(f.read().decode("utf-8"))
+    except Exception:
+        logger.exception("Catalog cache: snapshot ilegible", extra={"path": str(_SNAPSHOT_PATH)})
+        return False
+    if not isinstance(data, dict) or data.get("version") != _SNAPSHOT_VERSION:
+        return False
+
+    products = data.get("products") or []
+    if not products:
+        return False
+    saved_at = float(data.get("saved_at") or 0.0)
+    _replace_catalog(
+        products,
+        fetched_at=saved_at,
+        tokens=data.get("tokens") or {},
+    )
+    by_parent: Dict[int, List[Dict[str, Any]]] = {}
+    for record in data.get("variations") or []:
+        if isinstance(record, dict) and isinstance(record.get("parent_id"), int):
+            by_parent.setdefault(record["parent_id"], []).append(record)
+    for parent_id, rows in by_parent.items():
+        _set_variations(parent_id, rows, fetched_at=saved_at)
+    _prune_variations()
+    categories = data.get("categories") or []
+    if categories and not category_tree.loaded:
+        category_tree.replace(categories)
+    _cache_watermark = data.get("watermark")
+    _cache_full_synced_at = float(data.get("full_synced_at") or 0.0)
+    _cache_updated_at = 0.0  # stale: el refresher lo actualiza en segundo plano
+    logger.info(
+        "Catalog cache: snapshot cargado",
+        extra={
+            "products": len(_cache_products),
+            "variations": len(_cache_variations),
+            "categories": len(category_tree),
+            "saved_at": data.get("saved_at"),
+        },
+    )
+    return True
+
+
+async def _background_refresh() -> None:
+    try:
+        # Se lanza desde una búsqueda: el crawl no hereda el presupuesto del turno.
+        with without_deadline():
+            await _refresh_catalog_if_needed()
+    except Exception:
+        logger.exception("Catalog cache: fallo el refresco en segundo plano")
+
+
+def _schedule_background_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return
+    _refresh_task = asyncio.create_task(_background_refresh())
+
+
+async def _ensure_catalog() -> None:
+    """
+    Stale-while-revalidate: solo se espera al upstream si el cache nunca se pobló.
+    Si está vencido, se sirve la generación anterior y se refresca en segundo plano.
+    """
+    if not _cache_products:
+        await _refresh_catalog_if_needed()
+        return
+    if not _is_fresh():
+        _schedule_background_refresh()
+
+
+def _note_sync_patch(pid: int, product: Optional[Dict[str, Any]]) -> bool:
+    """
+    Anota un cambio de webhook para reaplicarlo al terminar el crawl completo en curso.
+    Devuelve True si había uno.
+    """
+    if _sync_patches is None:
+        return False
+    _sync_patches[pid] = product
+    return True
 
-def _score(pid: int, qtokens: List[str], line_hint: Optional[str]) -> int:
-    ptoks = _cache_tokens_by_id.get(pid, set())
-    score = 0
+
+def upsert_product(p: Dict[str, Any]) -> bool:
+    """
+    Actualiza en sitio un producto del cache (p. ej. desde un webhook de WooCommerce).
+
+    Si ya no está publicado, se retira. Si hay un crawl completo en curso, el cambio
+    se reaplica al terminar. Devuelve False si el cache aún no se pobló y no hay crawl
+    en curso: en ese caso el primer crawl completo ya traerá el estado actual.
+    """
+    pid = p.get("id")
+    if not isinstance(pid, int):
+        return False
+    parent_id = p.get("parent_id")
+    if p.get("type") == "variation" and isinstance(parent_id, int) and parent_id:
+        if not _cache_products:
+            return False
+        record = _compact_variation(project_product(p, "variation"), parent_id)
+        if record is None:
+            _drop_variation(pid)
+        else:
+            _index_variation(record, fetched_at=_now())
+        return True
+    product = project_product(p, "catalog") if p.get("status", "publish") == "publish" else None
+    syncing = _note_sync_patch(pid, product)
+    if not _cache_products:
+        return syncing
+    if product is not None:
+        _index_product(product)
+        if p.get("type") == "variable":
+            _schedule_variation_refresh(pid)
+    else:
+        _drop_product(pid)
+    return True
+
+
+def remove_product(pid: int) -> bool:
+    """
+    Retira un producto (o una variación) del cache (webhook product.deleted).
+    """
+    syncing = _note_sync_patch(int(pid), None)
+    if not _cache_products:
+        return syncing
+    _drop_product(int(pid))
+    _drop_variation(int(pid))
+    return True
+
+
+async def _refresh_variations(parent_id: int) -> bool:
+    try:
+        rows = await _fetch_variations_of(parent_id)
+    except Exception:
+        logger.warning("Catalog cache: no se pudieron refrescar variaciones", extra={"product_id": parent_id})
+        return False
+    _set_variations(parent_id, rows, fetched_at=_now())
+    return True
+
+
+def _schedule_variation_refresh(parent_id: int) -> None:
+    if not _VARIATIONS_ENABLED:
+        return
+    task = asyncio.create_task(_refresh_variations(parent_id))
+    _variation_tasks.add(task)
+    task.add_done_callback(_variation_tasks.discard)
+
+
+async def _refresh_stock(pid: int, cached: CatalogProduct) -> Optional[CatalogProduct]:
+    """
+    Refresco liviano de stock/precio de un producto cacheado (proyección "stock").
+    Si Woo no responde, se devuelve el registro cacheado; None si dejó de estar publicado.
+    """
+    try:
+        fresh = await woocommerce_client.get_product_by_id(pid, fields=PRODUCT_FIELDS["stock"])
+    except Exception:
+        fresh = None
+    if not fresh:
+        logger.warning("Catalog cache: no se pudo refrescar stock, se usa el cacheado", extra={"product_id": pid})
+        return cached
+    if fresh.get("status", "publish") != "publish":
+        _drop_product(pid)
+        return None
+    # Solo cambian stock/precio: el índice de tokens y el SKU siguen valiendo.
+    if _cache_products.get(pid) is not cached:
+        # Lo reemplazó un sync/webhook mientras tanto: no se toca el índice.
+        cached = dataclasses.replace(cached)
+        cached.update_stock(fresh)
+        return cached
+    if cached.update_stock(fresh):
+        _bump_generation(index=False)
+    cached.fetched_at = _now()
+    return cached
+
+
+def _variation_view(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Variación con la forma de un producto (nombre del padre + opción, permalink del padre).
+    """
+    parent = _cache_products.get(record["parent_id"])
+    base = (parent.name if parent is not None else "") or "producto"
+    label = " / ".join(record.get("attributes", {}).values())
+    view = dict(record)
+    view["name"] = f"{base} - {label}" if label else base
+    view["permalink"] = parent.permalink if parent is not None else None
+    view["type"] = "variation"
+    return view
+
+
+def _variation_is_fresh(vid: int) -> bool:
+    return (_now() - _cache_variation_fetched_at.get(vid, 0.0)) <= _SKU_FRESHNESS_SECONDS
+
+
+async def _refresh_variation_stock(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Refresco liviano de stock/precio de una variación cacheada (proyección "stock").
+    """
+    vid = record["id"]
+    fresh = await woocommerce_client.get_variation(record["parent_id"], vid, fields=PRODUCT_FIELDS["stock"])
+    if not fresh:
+        logger.warning("Catalog cache: no se pudo refrescar la variación, se usa la cacheada", extra={"variation_id": vid})
+        return record
+    if fresh.get("status", "publish") != "publish":
+        _drop_variation(vid)
+        return None
+    merged = dict(record)
+    for key in ("price", "regular_price", "stock_status", "stock_quantity", "manage_stock"):
+        if key in fresh:
+            merged[key] = fresh[key]
+    if _cache_variations.get(vid) is record:
+        _cache_variations[vid] = merged
+        _cache_variation_fetched_at[vid] = _now()
+    return merged
+
+
+async def _variations_of(parent_id: int) -> List[Dict[str, Any]]:
+    """
+    Variaciones de un producto variable desde el índice; si alguna está vieja se
+    re-consultan todas las del padre en una sola petición paginada.
+    """
+    ids = _cache_variation_ids_by_parent.get(parent_id, [])
+    if _VARIATIONS_ENABLED and (not ids or not all(_variation_is_fresh(vid) for vid in ids)):
+        await _refresh_variations(parent_id)
+        ids = _cache_variation_ids_by_parent.get(parent_id, [])
+    return [_variation_view(_cache_variations[vid]) for vid in ids if vid in _cache_variations]
+
+
+async def lookup_product_by_sku(sku: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca un producto (o una variación) por SKU en el índice local.
+
+    - Si el stock/precio cacheado es más viejo que CATALOG_SKU_FRESHNESS_SECONDS,
+      se re-consulta solo ese producto/variación (campos de stock).
+    - Los productos variables incluyen "variations" con el stock de cada opción.
+    - Si el cache aún no se pobló o el SKU no está, cae a la consulta en vivo a Woo.
+    """
+    if not _cache_products:
+        _schedule_background_refresh()
+        return await woocommerce_client.get_product_by_sku(sku)
+    if not _is_fresh():
+        _schedule_background_refresh()
+
+    key = normalize_sku(sku)
+    pid = _cache_ids_by_sku.get(key)
+    cached = _cache_products.get(pid) if pid is not None else None
+    if cached is None:
+        vid = _cache_variation_ids_by_sku.get(key)
+        record = _cache_variations.get(vid) if vid is not None else None
+        if record is None:
+            return await woocommerce_client.get_product_by_sku(sku)
+        if not _variation_is_fresh(vid):
+            record = await _refresh_variation_stock(record)
+        return _variation_view(record) if record else None
+
+    if (_now() - cached.fetched_at) <= _SKU_FRESHNESS_SECONDS:
+        product = cached.to_dict()
+    else:
+        refreshed = await _refresh_stock(pid, cached)
+        if refreshed is None:
+            return None
+        product = refreshed.to_dict()
+    if product.get("type") == "variable":
+        product["variations"] = await _variations_of(pid)
+    return product
+
+
+def _variation_stock(v: Dict[str, Any]) -> Dict[str, Any]:
+    summary = stock_summary(v)
+    summary["parent_id"] = v.get("parent_id")
+    summary["attributes"] = v.get("attributes") or {}
+    return summary
+
+
+async def lookup_stock_by_sku(sku: str) -> Optional[Dict[str, Any]]:
+    """
+    Igual que WooCommerceClient.get_stock_by_sku, pero resuelto con el índice local.
+
+    A diferencia de la versión en vivo, desglosa el stock de cada variación
+    (clave "variations") y acepta SKUs de variación.
+    """
+    product = await lookup_product_by_sku(sku)
+    if product is None:
+        return None
+    if product.get("type") == "variation":
+        return _variation_stock(product)
+    summary = stock_summary(product)
+    if product.get("variations"):
+        summary["variations"] = [_variation_stock(v) for v in product["variations"]]
+    return summary
+
+
+def catalog_age_seconds() -> Optional[float]:
+    """
+    Segundos desde el último refresco del catálogo en memoria (None si aún no se pobló).
+    """
+    if not _cache_products:
+        return None
+    return _now() - _cache_updated_at
+
+
+def catalog_status() -> Dict[str, Any]:
+    """
+    Estado del cache de catálogo (para observabilidad).
+    """
+    populated = bool(_cache_products)
+    return {
+        "populated": populated,
+        "products": len(_cache_products),
+        "skus": len(_cache_ids_by_sku),
+        "variable_products": len(_cache_variation_ids_by_parent),
+        "variations": len(_cache_variations),
+        "categories": len(category_tree),
+        "index": _token_index.stats(),
+        "spelling": _corrector.stats(),
+        "numeric": _range_index.stats(),
+        "scoring": _scoring_stats(),
+        "vectors": _vectors.stats() if _vectors is not None else None,
+        "stale": populated and not _is_fresh(),
+        "age_seconds": round(_now() - _cache_updated_at, 1) if populated else None,
+        "last_refresh_kind": _last_refresh_kind,
+        "last_refresh_duration_seconds": (
+            round(_last_refresh_duration, 3) if _last_refresh_duration is not None else None
+        ),
+        "last_refresh_error": _last_refresh_error,
+        "refreshing": _lock.locked(),
+        "watermark": _cache_watermark,
+        "generation": _cache_generation,
+        "index_generation": _index_generation,
+    }
+
+
+async def catalog_refresh_loop() -> None:
+    logger.info(
+        "Catalog refresh loop started",
+        extra={"interval_sec": _CACHE_TTL_SECONDS, "full_sync_sec": _FULL_SYNC_SECONDS},
+    )
+    while True:
+        try:
+            await _refresh_catalog_if_needed()
+        except Exception:
+            logger.exception("Catalog refresh loop error")
+        await asyncio.sleep(_CACHE_TTL_SECONDS)
+
+
+def start_catalog_refresh_task() -> None:
+    global _refresh_loop_task
+    if _refresh_loop_task is not None and not _refresh_loop_task.done():
+        return
+    load_catalog_snapshot()
+    _refresh_loop_task = asyncio.create_task(catalog_refresh_loop())
+
+
+def stop_catalog_refresh_task() -> None:
+    if _refresh_loop_task is not None:
+        _refresh_loop_task.cancel()
+
+
+_LINE_HINT_BOOST = 1.0  # aporte fijo si el producto contiene el token de la línea
+_SEMANTIC_MIN_SCORE = 0.2   # similitud coseno mínima: por debajo son coincidencias de n-gramas sueltos
+_NUMERIC_MATCH_BOOST = 1.5  # aporte fijo si las medidas del producto cumplen todos los filtros numéricos
+_PREFIX_WEIGHT = 0.7       # peso de un token completado por prefijo ("filtr" -> filtro)
+_CORRECTION_WEIGHT = 0.8   # peso de un token corregido por typo ("bonba" -> bomba)
+_MIN_PREFIX_LEN = 4
+_MAX_EXPANSIONS = 4
+
+
+def _resolve_query_tokens(qtokens: List[str]) -> Tuple[List[str], Dict[str, float], Dict[str, List[str]]]:
+    """
+    Tokens que no existen en el índice se reemplazan localmente por sus
+    completados de prefijo (más frecuentes primero) o, si no hay, por las
+    correcciones más cercanas. Devuelve (tokens, pesos, expansiones).
+    """
+    tokens: List[str] = []
+    weights: Dict[str, float] = {}
+    expansions: Dict[str, List[str]] = {}
     for t in qtokens:
-        if t in ptoks:
-            score += 3
+        if _token_index.df(t):
+            tokens.append(t)
+            continue
+        alternatives: List[str] = []
+        weight = _PREFIX_WEIGHT
+        if len(t) >= _MIN_PREFIX_LEN:
+            completions = [w for w in _corrector.complete(t, limit=50) if _token_index.df(w)]
+            completions.sort(key=_token_index.df, reverse=True)
+            alternatives = completions[:_MAX_EXPANSIONS]
+        if not alternatives:
+            corrections = [(w, d) for w, d in _corrector.correct(t) if _token_index.df(w)]
+            if corrections:
+                best = corrections[0][1]
+                alternatives = [w for w, d in corrections if d == best][:_MAX_EXPANSIONS]
+                weight = _CORRECTION_WEIGHT
+        if not alternatives:
+            continue
+        expansions[t] = alternatives
+        for alt in alternatives:
+            if alt not in weights and alt not in tokens:
+                tokens.append(alt)
+                weights[alt] = weight
+    return tokens, weights, expansions
+
+
+def _line_hint_postings(line_hint: str) -> set[int]:
+    """
+    Productos que contienen todas las raíces de la línea ("agua_potable" -> agua + potabl).
+    """
+    stems = analyze(line_hint)
+    if not stems:
+        return set()
+    pids = set(_token_index.postings(stems[0]))
+    for t in stems[1:]:
+        pids.intersection_update(_token_index.postings(t))
+    return pids
+
+
+def _score_candidates(
+    qtokens: List[str],
+    line_hint: Optional[str],
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[int, float]:
+    """
+    Score BM25 por producto recorriendo solo las postings de los tokens de la consulta.
+    """
+    scores = _token_index.score(qtokens, weights)
 
     # pequeño boost si coincide la línea (por tokens)
-    if line_hint and _norm(line_hint) in ptoks:
-        score += 2
+    if line_hint:
+        for pid in _line_hint_postings(line_hint):
+            scores[pid] = scores.get(pid, 0.0) + _LINE_HINT_BOOST
 
-    return score
+    return scores
 
 
-async def search_catalog(query: str, *, line_hint: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
+def _current_matrix() -> Optional[CatalogMatrix]:
     """
-    Devuelve candidatos ordenados por score (ranking local).
+    Última matriz BM25 armada. Mientras se rearma tras un cambio de texto sigue
+    sirviendo la anterior; None hasta que exista la primera.
     """
-    await _refresh_catalog_if_needed()
+    return _matrix if _VECTOR_SCORING else None
 
-    qtokens = _expand_query_tokens(query, line_hint)
 
-    ranked: List[Tuple[int, Dict[str, Any]]] = []
-    for p in _cache_products:
-        pid = p.get("id")
-        if not isinstance(pid, int):
-            continue
-        s = _score(pid, qtokens, line_hint)
-        if s > 0:
-            ranked.append((s, p))
+def _current_vectors() -> Optional[VectorIndex]:
+    """
+    Último índice vectorial armado (mismo ciclo de vida que _current_matrix).
+    """
+    return _vectors if _SEMANTIC_ENABLED else None
+
+
+def _schedule_derived_indexes() -> None:
+    """
+    Rearma la matriz BM25 y el índice vectorial en un hilo (asyncio.to_thread)
+    sin bloquear el event loop. Sin loop corriendo (scripts, pruebas) se arman en el acto.
+    """
+    global _derived_task, _matrix, _vectors
+    if not (_VECTOR_SCORING or _SEMANTIC_ENABLED):
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        if _VECTOR_SCORING:
+            _matrix = CatalogMatrix.build(_token_index, _cache_products, generation=_index_generation)
+        if _SEMANTIC_ENABLED:
+            _vectors = VectorIndex.build(_cache_products, generation=_index_generation)
+        return
+    if _derived_task is None or _derived_task.done():
+        _derived_task = asyncio.create_task(_rebuild_derived_indexes())
+
+
+async def _rebuild_derived_indexes() -> None:
+    global _matrix, _vectors
+    while True:
+        generation = _index_generation
+        if not _cache_products:
+            return
+        # Las copias se toman en el loop; el armado corre en un hilo.
+        try:
+            if _VECTOR_SCORING and (_matrix is None or _matrix.generation != generation):
+                inputs = CatalogMatrix.snapshot(_token_index, _cache_products)
+                _matrix = await asyncio.to_thread(CatalogMatrix.build_from, inputs, generation=generation)
+        except Exception:
+            logger.exception("Catalog cache: no se pudo armar la matriz BM25")
+        try:
+            if _SEMANTIC_ENABLED and (_vectors is None or _vectors.generation != generation):
+                products = dict(_cache_products)
+                _vectors = await asyncio.to_thread(VectorIndex.build, products, generation=generation)
+        except Exception:
+            logger.exception("Catalog cache: no se pudo armar el índice vectorial")
+        if generation == _index_generation:
+            return
 
+
+def _scoring_stats() -> Dict[str, Any]:
+    if not _VECTOR_SCORING:
+        return {"engine": "index", "matrix_available": MATRIX_AVAILABLE}
+    stats: Dict[str, Any] = {"engine": "matrix", "matrix_available": True}
+    if _matrix is not None:
+        stats.update(
+            rows=len(_matrix),
+            columns=len(_matrix.columns),
+            nnz=int(_matrix.matrix.nnz),
+            fresh=_matrix.generation == _index_generation,
+        )
+    return stats
+
+
+def _rank_with_index(
+    qtokens: List[str],
+    line_hint: Optional[str],
+    weights: Dict[str, float],
+    *,
+    allowed: Optional[frozenset[int]],
+    rejected: set[int],
+    matched: set[int],
+    limit: int,
+) -> List[Tuple[float, CatalogProduct]]:
+    ranked: List[Tuple[float, CatalogProduct]] = []
+    for pid, s in _score_candidates(qtokens, line_hint, weights).items():
+        if pid in rejected:
+            continue
+        record = _cache_products.get(pid)
+        if record is None:
+            continue
+        if allowed is not None and not _in_categories(record, allowed):
+            continue
+        ranked.append((s + (_NUMERIC_MATCH_BOOST if pid in matched else 0.0), record))
     ranked.sort(key=lambda x: x[0], reverse=True)
-    return [p for _, p in ranked[:limit]]
+    return ranked[:limit]
+
+
+def _rank_with_matrix(
+    matrix: CatalogMatrix,
+    qtokens: List[str],
+    line_hint: Optional[str],
+    weights: Dict[str, float],
+    *,
+    allowed: Optional[frozenset[int]],
+    rejected: set[int],
+    matched: set[int],
+    limit: int,
+) -> List[Tuple[float, CatalogProduct]]:
+    """
+    Mismo ranking que _rank_with_index, pero con operaciones vectoriales: un
+    producto matriz-vector para BM25, máscaras para línea/categoría/medidas y
+    selección parcial para el top-k.
+    """
+    scores = matrix.score(qtokens, weights)
+    if line_hint:
+        stems = analyze(line_hint)
+        if stems:
+            scores = scores + _LINE_HINT_BOOST * matrix.token_mask(stems)
+    candidates = scores > 0
+    if rejected:
+        candidates[matrix.rows_for(rejected)] = False
+    if allowed is not None:
+        candidates &= matrix.category_mask(allowed)
+    if matched:
+        scores = scores.copy()
+        scores[matrix.rows_for(matched)] += _NUMERIC_MATCH_BOOST
+    ranked: List[Tuple[float, CatalogProduct]] = []
+    for pid, s in matrix.top_k(scores, candidates, limit):
+        record = _cache_products.get(pid)
+        if record is not None:
+            ranked.append((s, record))
+    return ranked
+
+
+def _explain(
+    pid: int,
+    qtokens: List[str],
+    line_hint: Optional[str],
+    weights: Dict[str, float],
+    expansions: Dict[str, List[str]],
+) -> Dict[str, Any]:
+    breakdown = _token_index.explain(pid, qtokens, weights)
+    stems = analyze(line_hint) if line_hint else ()
+    matches = bool(stems) and all(_token_index.has(pid, t) for t in stems)
+    boost = _LINE_HINT_BOOST if matches else 0.0
+    breakdown["line_hint"] = boost
+    breakdown["expansions"] = expansions
+    breakdown["total"] = round(breakdown["bm25"] + boost, 3)
+    return breakdown
+
+
+def _in_categories(record: CatalogProduct, allowed: frozenset[int]) -> bool:
+    return any(cid in allowed for cid in record.category_ids())
+
+
+def _numeric_rejects(filters: Sequence[NumericFilter]) -> Tuple[set[int], set[int]]:
+    """
+    (descartados, coincidentes) según los filtros numéricos, usando el índice de rangos.
+
+    Un producto se descarta si declara el atributo y ninguno de sus valores cae en
+    el rango; si no lo declara no se descarta (pero tampoco recibe el boost).
+    """
+    rejected: set[int] = set()
+    matched: Optional[set[int]] = None
+    for f in filters:
+        inside: set[int] = set()
+        for lo, hi in f.ranges:
+            inside |= _range_index.range(f.attr, lo, hi)
+        rejected |= _range_index.docs_with(f.attr) - inside
+        matched = inside if matched is None else matched & inside
+    return rejected, matched or set()
+
+
+def catalog_numeric_values(product_id: int) -> Optional[Dict[str, List[float]]]:
+    """
+    Medidas indexadas de un producto del cache (None si no está cacheado).
+    """
+    if product_id not in _cache_products:
+        return None
+    return _range_index.values(product_id)
+
+
+async def search_catalog(
+    query: str,
+    *,
+    line_hint: Optional[str],
+    limit: int = 50,
+    category: Optional[Any] = None,
+    numeric: Optional[Sequence[NumericFilter]] = None,
+    explain: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve candidatos ordenados por score BM25 (ranking local).
+
+    `category` (slug o id) restringe a esa categoría y todas sus subcategorías;
+    si no existe en el árbol se ignora. `numeric` (ver numeric_attributes.
+    parse_numeric_filters) descarta en memoria los productos cuyas medidas no
+    cumplen y suma un boost a los que sí. Con `explain=True` cada resultado trae
+    "score_breakdown" (aporte de cada token por campo, idf y boosts).
+    """
+    await _ensure_catalog()
+
+    qtokens, weights, expansions = _resolve_query_tokens(_expand_query_tokens(query, line_hint))
+
+    allowed: Optional[frozenset[int]] = None
+    if category is not None:
+        cid = category_tree.resolve(category)
+        if cid is not None:
+            allowed = category_tree.subtree_ids(cid)
+
+    rejected: set[int] = set()
+    matched: set[int] = set()
+    if numeric:
+        rejected, matched = _numeric_rejects(numeric)
+
+    constraints = {"allowed": allowed, "rejected": rejected, "matched": matched, "limit": limit}
+    matrix = _current_matrix()
+    if matrix is not None:
+        ranked = _rank_with_matrix(matrix, qtokens, line_hint, weights, **constraints)
+    else:
+        ranked = _rank_with_index(qtokens, line_hint, weights, **constraints)
+
+    results: List[Dict[str, Any]] = []
+    for _, record in ranked:
+        product = record.to_dict()
+        if explain:
+            breakdown = _explain(record.id, qtokens, line_hint, weights, expansions)
+            if numeric:
+                boost = _NUMERIC_MATCH_BOOST if record.id in matched else 0.0
+                breakdown["numeric"] = {
+                    "filters": {f.attr: f.describe() for f in numeric},
+                    "values": _range_index.values(record.id),
+                    "boost": boost,
+                }
+                breakdown["total"] = round(breakdown["total"] + boost, 3)
+            product["score_breakdown"] = breakdown
+        results.append(product)
+    return results
+
+
+async def semantic_search_catalog(
+    query: str,
+    *,
+    limit: int = 20,
+    category: Optional[Any] = None,
+    min_score: float = _SEMANTIC_MIN_SCORE,
+) -> List[Dict[str, Any]]:
+    """
+    Vecinos más cercanos de la consulta en el índice vectorial local (sin red).
+    Cada resultado trae "semantic_score" (similitud coseno). Vacío si está desactivado.
+    """
+    await _ensure_catalog()
+    vectors = _current_vectors()
+    if vectors is None:
+        return []
+
+    allowed: Optional[frozenset[int]] = None
+    if category is not None:
+        cid = category_tree.resolve(category)
+        if cid is not None:
+            subtree = category_tree.subtree_ids(cid)
+            allowed = frozenset(
+                pid for pid, record in _cache_products.items() if _in_categories(record, subtree)
+            )
+
+    results: List[Dict[str, Any]] = []
+    for pid, score in vectors.search(query, limit=limit, min_score=min_score, allowed=allowed):
+        record = _cache_products.get(pid)
+        if record is None:
+            continue
+        product = record.to_dict()
+        product["semantic_score"] = round(score, 4)
+        results.append(product)
+    return results
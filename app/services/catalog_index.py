@@ -0,0 +1,580 @@
+from __future__ import annotations
+
+import math
+import sys
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Campos de stock/precio que se pueden refrescar en sitio (proyección "stock").
+STOCK_KEYS: Tuple[str, ...] = ("price", "regular_price", "stock_status", "stock_quantity", "manage_stock")
+
+
+def _intern(value: Any) -> Optional[str]:
+    """
+    Interna strings cortos y repetidos (tipo, estado, precio, nombres de categoría)
+    para que miles de productos compartan la misma instancia.
+    """
+    if value is None:
+        return None
+    s = str(value)
+    return sys.intern(s) if len(s) <= 64 else s
+
+
+@dataclass(slots=True)
+class CatalogProduct:
+    """
+    Registro compacto de un producto del catálogo local (proyección "catalog").
+
+    Reemplaza al dict de Woo: sin tabla hash por producto, categorías como tuplas
+    (id, name, slug) y atributos como (name, options) internados, y `fetched_at`
+    en el mismo registro.
+    `to_dict()` reconstruye la forma de Woo para los llamadores.
+    """
+
+    id: int
+    name: str
+    sku: str
+    price: Optional[str]
+    regular_price: Optional[str]
+    stock_status: Optional[str]
+    stock_quantity: Optional[int]
+    manage_stock: Optional[bool]
+    permalink: Optional[str]
+    short_description: str
+    categories: Tuple[Tuple[int, str, str], ...]
+    attributes: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    type: Optional[str]
+    status: Optional[str]
+    date_modified_gmt: Optional[str]
+    fetched_at: float = 0.0
+
+    @classmethod
+    def from_dict(cls, p: Dict[str, Any], *, fetched_at: float = 0.0) -> "CatalogProduct":
+        categories = tuple(
+            (c.get("id"), _intern(c.get("name") or ""), _intern(c.get("slug") or ""))
+            for c in p.get("categories") or []
+            if isinstance(c, dict)
+        )
+        attributes = tuple(
+            (_intern(a.get("name") or ""), tuple(_intern(o) for o in a.get("options") or ()))
+            for a in p.get("attributes") or []
+            if isinstance(a, dict) and a.get("name")
+        )
+        return cls(
+            id=int(p["id"]),
+            name=p.get("name") or "",
+            sku=_intern(p.get("sku") or ""),
+            price=_intern(p.get("price")),
+            regular_price=_intern(p.get("regular_price")),
+            stock_status=_intern(p.get("stock_status")),
+            stock_quantity=p.get("stock_quantity"),
+            manage_stock=p.get("manage_stock"),
+            permalink=p.get("permalink"),
+            short_description=p.get("short_description") or "",
+            categories=categories,
+            attributes=attributes,
+            type=_intern(p.get("type")),
+            status=_intern(p.get("status")),
+            date_modified_gmt=p.get("date_modified_gmt"),
+            fetched_at=fetched_at,
+        )
+
+    def category_ids(self) -> Tuple[int, ...]:
+        return tuple(c[0] for c in self.categories)
+
+    def update_stock(self, fresh: Dict[str, Any]) -> bool:
+        """
+        Aplica stock/precio recién consultados. Devuelve True si algo cambió.
+        """
+        changed = False
+        for key in STOCK_KEYS:
+            if key not in fresh:
+                continue
+            value = fresh[key]
+            if key != "stock_quantity" and key != "manage_stock":
+                value = _intern(value)
+            if getattr(self, key) != value:
+                setattr(self, key, value)
+                changed = True
+        return changed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "sku": self.sku,
+            "price": self.price,
+            "regular_price": self.regular_price,
+            "stock_status": self.stock_status,
+            "stock_quantity": self.stock_quantity,
+            "manage_stock": self.manage_stock,
+            "permalink": self.permalink,
+            "short_description": self.short_description,
+            "categories": [{"id": cid, "name": name, "slug": slug} for cid, name, slug in self.categories],
+            "attributes": [{"name": name, "options": list(options)} for name, options in self.attributes],
+            "type": self.type,
+            "status": self.status,
+            "date_modified_gmt": self.date_modified_gmt,
+        }
+
+
+# Campos indexados y su peso en BM25 (una coincidencia en el nombre pesa más que en la descripción).
+FIELD_WEIGHTS: Dict[str, float] = {
+    "name": 3.0,
+    "categories": 2.0,
+    "short_description": 1.0,
+}
+_FIELDS: Tuple[str, ...] = tuple(FIELD_WEIGHTS)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class InvertedIndex:
+    """
+    Índice invertido compacto con ranking BM25 por campos.
+
+    - Cada token se interna a un id entero.
+    - Postings (token -> productos) en `array('I')`, con el tf ponderado por campo
+      en un `array('f')` paralelo: el score de una consulta solo recorre las
+      postings de sus tokens, no el catálogo completo.
+    - Por producto se guardan sus token ids ordenados y el tf de cada campo
+      (`array('H')`), para explicar el score y para reconstruir los tokens.
+    """
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None) -> None:
+        self.field_weights = dict(field_weights or FIELD_WEIGHTS)
+        self._ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self._postings: Dict[int, array] = {}
+        self._posting_tf: Dict[int, array] = {}
+        self._doc_tids: Dict[int, array] = {}
+        self._doc_tf: Dict[int, Tuple[array, ...]] = {}
+        self._doc_len: Dict[int, float] = {}
+        self._total_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_tids)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_tids
+
+    def _token_id(self, token: str) -> int:
+        tid = self._ids.get(token)
+        if tid is None:
+            tid = len(self._tokens)
+            token = sys.intern(token)
+            self._ids[token] = tid
+            self._tokens.append(token)
+        return tid
+
+    def add(self, doc_id: int, fields: Dict[str, Iterable[str]]) -> None:
+        """
+        Indexa un producto. `fields` mapea campo -> tokens (con repeticiones: cuentan como tf).
+        """
+        if doc_id in self._doc_tids:
+            self.remove(doc_id)
+
+        counts: Dict[int, List[int]] = {}
+        length = 0.0
+        for f_idx, field in enumerate(_FIELDS):
+            weight = self.field_weights.get(field, 0.0)
+            for token in fields.get(field) or ():
+                if not token:
+                    continue
+                tid = self._token_id(token)
+                row = counts.get(tid)
+                if row is None:
+                    row = counts[tid] = [0] * len(_FIELDS)
+                row[f_idx] += 1
+                length += weight
+
+        tids = sorted(counts)
+        self._doc_tids[doc_id] = array("I", tids)
+        self._doc_tf[doc_id] = tuple(
+            array("H", (min(counts[tid][f_idx], 65535) for tid in tids)) for f_idx in range(len(_FIELDS))
+        )
+        self._doc_len[doc_id] = length
+        self._total_len += length
+
+        for tid in tids:
+            weighted = sum(self.field_weights.get(field, 0.0) * counts[tid][f_idx] for f_idx, field in enumerate(_FIELDS))
+            posting = self._postings.get(tid)
+            if posting is None:
+                posting = self._postings[tid] = array("I")
+                self._posting_tf[tid] = array("f")
+            posting.append(doc_id)
+            self._posting_tf[tid].append(weighted)
+
+    def remove(self, doc_id: int) -> None:
+        tids = self._doc_tids.pop(doc_id, None)
+        if tids is None:
+            return
+        self._doc_tf.pop(doc_id, None)
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        for tid in tids:
+            posting = self._postings.get(tid)
+            if posting is None:
+                continue
+            try:
+                pos = posting.index(doc_id)
+            except ValueError:
+                continue
+            del posting[pos]
+            del self._posting_tf[tid][pos]
+            if not posting:
+                del self._postings[tid]
+                del self._posting_tf[tid]
+
+    def postings(self, token: str) -> array:
+        tid = self._ids.get(token)
+        if tid is None:
+            return array("I")
+        return self._postings.get(tid, array("I"))
+
+    def df(self, token: str) -> int:
+        return len(self.postings(token))
+
+    def doc_tokens(self, doc_id: int) -> List[str]:
+        return [self._tokens[tid] for tid in self._doc_tids.get(doc_id, ())]
+
+    def vocabulary(self) -> List[str]:
+        return [self._tokens[tid] for tid in self._postings]
+
+    def has(self, doc_id: int, token: str) -> bool:
+        return self._doc_position(doc_id, token) is not None
+
+    def _doc_position(self, doc_id: int, token: str) -> Optional[int]:
+        tid = self._ids.get(token)
+        tids = self._doc_tids.get(doc_id)
+        if tid is None or tids is None:
+            return None
+        i = bisect_left(tids, tid)
+        return i if i < len(tids) and tids[i] == tid else None
+
+    def fields(self, doc_id: int) -> Dict[str, List[str]]:
+        """
+        Tokens de cada campo (con repeticiones), p. ej. para el snapshot.
+        """
+        tids = self._doc_tids.get(doc_id, array("I"))
+        tfs = self._doc_tf.get(doc_id)
+        out: Dict[str, List[str]] = {field: [] for field in _FIELDS}
+        if tfs is None:
+            return out
+        for f_idx, field in enumerate(_FIELDS):
+            for i, tid in enumerate(tids):
+                out[field].extend([self._tokens[tid]] * tfs[f_idx][i])
+        return out
+
+    def idf(self, token: str) -> float:
+        df = len(self.postings(token))
+        n = len(self._doc_tids)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _avg_len(self) -> float:
+        return (self._total_len / len(self._doc_len)) if self._doc_len else 0.0
+
+    def score(self, tokens: Iterable[str], weights: Optional[Dict[str, float]] = None) -> Dict[int, float]:
+        """
+        Score BM25 (tf ponderado por campo) de cada producto que contiene algún token.
+
+        `weights` escala el aporte de tokens puntuales (p. ej. correcciones de typos).
+        """
+        scores: Dict[int, float] = {}
+        avg_len = self._avg_len() or 1.0
+        doc_len = self._doc_len
+        for token in dict.fromkeys(tokens):
+            tid = self._ids.get(token)
+            posting = self._postings.get(tid) if tid is not None else None
+            if not posting:
+                continue
+            idf = self.idf(token) * (weights.get(token, 1.0) if weights else 1.0)
+            tfs = self._posting_tf[tid]
+            for doc_id, tf in zip(posting, tfs):
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len.get(doc_id, 0.0) / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
+
+    def explain(
+        self,
+        doc_id: int,
+        tokens: Iterable[str],
+        weights: Optional[Dict[str, float]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Desglose del score BM25 de un producto: por token, tf de cada campo, idf y aporte.
+        """
+        avg_len = self._avg_len() or 1.0
+        length = self._doc_len.get(doc_id, 0.0)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / avg_len)
+        terms: Dict[str, Any] = {}
+        total = 0.0
+        tfs = self._doc_tf.get(doc_id)
+        for token in dict.fromkeys(tokens):
+            pos = self._doc_position(doc_id, token)
+            if pos is None or tfs is None:
+                continue
+            by_field = {field: int(tfs[f_idx][pos]) for f_idx, field in enumerate(_FIELDS) if tfs[f_idx][pos]}
+            tf = sum(self.field_weights.get(field, 0.0) * n for field, n in by_field.items())
+            idf = self.idf(token)
+            weight = weights.get(token, 1.0) if weights else 1.0
+            contribution = weight * idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+            total += contribution
+            terms[token] = {
+                "fields": by_field,
+                "weighted_tf": round(tf, 3),
+                "idf": round(idf, 3),
+                "weight": weight,
+                "score": round(contribution, 3),
+            }
+        return {"bm25": round(total, 3), "doc_length": round(length, 1), "avg_length": round(avg_len, 1), "terms": terms}
+
+    def doc_lengths(self) -> Dict[int, float]:
+        """
+        Largo ponderado de cada producto (para precalcular la normalización BM25).
+        """
+        return self._doc_len
+
+    def columns(self) -> Iterator[Tuple[str, array, array]]:
+        """
+        Por token: (token, postings, tf ponderado de cada producto), p. ej. para
+        armar una matriz dispersa documento x token.
+        """
+        for tid, posting in self._postings.items():
+            yield self._tokens[tid], posting, self._posting_tf[tid]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._doc_tids),
+            "vocabulary": len(self._postings),
+            "postings": sum(len(p) for p in self._postings.values()),
+            "avg_length": round(self._avg_len(), 1),
+            "field_weights": dict(self.field_weights),
+        }
+
+
+def _deletes(word: str, distance: int) -> set[str]:
+    """
+    Variantes de `word` con hasta `distance` caracteres borrados (SymSpell).
+    """
+    out = {word}
+    frontier = {word}
+    for _ in range(distance):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Distancia Damerau-Levenshtein (transposiciones adyacentes), cortando en `limit + 1`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class TermCorrector:
+    """
+    Corrección de typos y autocompletado sobre el vocabulario del catálogo.
+
+    - Índice de borrados estilo SymSpell: cada palabra se registra bajo sus variantes
+      con 1-2 caracteres borrados; una consulta genera sus propios borrados y cruza
+      (sin recorrer el vocabulario), luego se verifica con Damerau-Levenshtein.
+    - Prefijos: vocabulario ordenado + búsqueda binaria ("filtr" -> filtro, filtros...).
+
+    La distancia máxima depende del largo: 0 hasta 3 letras, 1 hasta 7, 2 desde 8.
+    """
+
+    def __init__(self) -> None:
+        self._words: set[str] = set()
+        self._sorted: List[str] = []
+        self._deletes: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @staticmethod
+    def max_distance(word: str) -> int:
+        n = len(word)
+        if n <= 3:
+            return 0
+        return 1 if n <= 7 else 2
+
+    def add(self, word: str) -> None:
+        if not word or word in self._words:
+            return
+        word = sys.intern(word)
+        self._words.add(word)
+        insort(self._sorted, word)
+        for variant in _deletes(word, self.max_distance(word)):
+            self._deletes.setdefault(variant, []).append(word)
+
+    def discard(self, word: str) -> None:
+        """
+        Retira una palabra que ya no está en ningún producto (renombrado o retirado).
+        """
+        if word not in self._words:
+            return
+        self._words.discard(word)
+        i = bisect_left(self._sorted, word)
+        if i < len(self._sorted) and self._sorted[i] == word:
+            del self._sorted[i]
+        for variant in _deletes(word, self.max_distance(word)):
+            words = self._deletes.get(variant)
+            if words is None:
+                continue
+            try:
+                words.remove(word)
+            except ValueError:
+                continue
+            if not words:
+                del self._deletes[variant]
+
+    def build(self, words: Iterable[str]) -> None:
+        self._words = set()
+        self._sorted = []
+        self._deletes = {}
+        for word in words:
+            if word and word not in self._words:
+                word = sys.intern(word)
+                self._words.add(word)
+                for variant in _deletes(word, self.max_distance(word)):
+                    self._deletes.setdefault(variant, []).append(word)
+        self._sorted = sorted(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._words
+
+    def correct(self, term: str) -> List[Tuple[str, int]]:
+        """
+        Palabras del vocabulario a distancia acotada de `term`, de la más cercana a la más lejana.
+        """
+        limit = self.max_distance(term)
+        if limit == 0:
+            return [(term, 0)] if term in self._words else []
+        found: Dict[str, int] = {}
+        for variant in _deletes(term, limit):
+            for word in self._deletes.get(variant, ()):
+                if word in found:
+                    continue
+                found[word] = edit_distance(term, word, limit)
+        return sorted(((w, d) for w, d in found.items() if d <= limit), key=lambda x: (x[1], x[0]))
+
+    def complete(self, prefix: str, limit: int = 20) -> List[str]:
+        """
+        Palabras del vocabulario que empiezan con `prefix` (orden alfabético).
+        """
+        if not prefix:
+            return []
+        out: List[str] = []
+        i = bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix) and len(out) < limit:
+            out.append(self._sorted[i])
+            i += 1
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"words": len(self._words), "delete_keys": len(self._deletes)}
+
+
+class RangeIndex:
+    """
+    Índice de rangos por atributo numérico (HP, V, m3/h, BTU, litros, mca, fases).
+
+    Por atributo guarda los valores ordenados en un `array('d')` con el id del
+    producto en un `array('I')` paralelo: un rango [lo, hi] son dos bisect y un
+    recorte, sin mirar el resto del catálogo. Las altas y bajas se acumulan y el
+    atributo se reordena una sola vez en la siguiente consulta.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[str, array] = {}
+        self._docs: Dict[str, array] = {}
+        self._dirty: set[str] = set()
+        self._by_doc: Dict[int, Tuple[Tuple[str, float], ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_doc)
+
+    def add(self, doc_id: int, attributes: Dict[str, Iterable[float]]) -> None:
+        if doc_id in self._by_doc:
+            self.remove(doc_id)
+        pairs = tuple((attr, float(v)) for attr, values in attributes.items() for v in dict.fromkeys(values))
+        if not pairs:
+            return
+        self._by_doc[doc_id] = pairs
+        for attr, v in pairs:
+            values = self._values.get(attr)
+            if values is None:
+                values = self._values[attr] = array("d")
+                self._docs[attr] = array("I")
+            values.append(v)
+            self._docs[attr].append(doc_id)
+            self._dirty.add(attr)
+
+    def remove(self, doc_id: int) -> None:
+        pairs = self._by_doc.pop(doc_id, None)
+        if not pairs:
+            return
+        for attr in {a for a, _ in pairs}:
+            values, docs = self._values[attr], self._docs[attr]
+            keep = [i for i, d in enumerate(docs) if d != doc_id]
+            if not keep:
+                del self._values[attr], self._docs[attr]
+                self._dirty.discard(attr)
+                continue
+            self._values[attr] = array("d", (values[i] for i in keep))
+            self._docs[attr] = array("I", (docs[i] for i in keep))
+
+    def _sorted(self, attr: str) -> Tuple[array, array]:
+        if attr in self._dirty:
+            order = sorted(range(len(self._values[attr])), key=self._values[attr].__getitem__)
+            self._values[attr] = array("d", (self._values[attr][i] for i in order))
+            self._docs[attr] = array("I", (self._docs[attr][i] for i in order))
+            self._dirty.discard(attr)
+        return self._values.get(attr, array("d")), self._docs.get(attr, array("I"))
+
+    def range(self, attr: str, lo: float, hi: float) -> set[int]:
+        """
+        Productos con algún valor del atributo en [lo, hi].
+        """
+        if attr not in self._values:
+            return set()
+        values, docs = self._sorted(attr)
+        return set(docs[bisect_left(values, lo):bisect_right(values, hi)])
+
+    def docs_with(self, attr: str) -> set[int]:
+        return set(self._docs.get(attr, ()))
+
+    def values(self, doc_id: int) -> Dict[str, List[float]]:
+        out: Dict[str, List[float]] = {}
+        for attr, v in self._by_doc.get(doc_id, ()):
+            out.setdefault(attr, []).append(v)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._by_doc),
+            "attributes": {attr: len(values) for attr, values in sorted(self._values.items())},
+        }
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from app.services.catalog_index import BM25_B, BM25_K1, CatalogProduct, InvertedIndex
+
+try:
+    import numpy as np
+    from scipy import sparse
+except Exception:  # pragma: no cover - dependencia opcional
+    np = None
+    sparse = None
+
+MATRIX_AVAILABLE = np is not None and sparse is not None
+
+# (largo por producto, columnas (token, postings, tf), categorías por producto): ver CatalogMatrix.snapshot.
+MatrixInputs = Tuple[Dict[int, float], List[Tuple[str, array, array]], Dict[int, Tuple[int, ...]]]
+
+
+class CatalogMatrix:
+    """
+    Matriz dispersa producto x token (CSC) con el aporte BM25 de cada par ya
+    precalculado: el score de una consulta es un solo producto matriz-vector y
+    el top-k sale de una selección parcial (`np.partition`), sin recorrer productos en Python.
+
+    Se arma desde una copia de un InvertedIndex (`snapshot` en el event loop,
+    `build_from` en un hilo) cada vez que cambia el texto indexado; mientras
+    tanto se sigue usando la anterior. Requiere numpy + scipy; sin ellos
+    `MATRIX_AVAILABLE` es False y catalog_cache usa InvertedIndex.score.
+    """
+
+    def __init__(
+        self,
+        doc_ids: "np.ndarray",
+        columns: Dict[str, int],
+        matrix: "sparse.csc_matrix",
+        category_rows: Dict[int, "np.ndarray"],
+        generation: int,
+    ) -> None:
+        self.doc_ids = doc_ids
+        self.columns = columns
+        self.matrix = matrix
+        self.category_rows = category_rows
+        self.generation = generation
+
+    @staticmethod
+    def snapshot(index: InvertedIndex, products: Mapping[int, CatalogProduct]) -> "MatrixInputs":
+        """
+        Copia (barata, en el event loop) de lo que necesita `build_from`, para
+        armar la matriz en un hilo mientras el índice sigue cambiando.
+        """
+        lengths = dict(index.doc_lengths())
+        columns = [(token, array("I", posting), array("f", tfs)) for token, posting, tfs in index.columns()]
+        categories = {pid: record.category_ids() for pid, record in products.items()}
+        return lengths, columns, categories
+
+    @classmethod
+    def build(
+        cls,
+        index: InvertedIndex,
+        products: Mapping[int, CatalogProduct],
+        *,
+        generation: int,
+    ) -> "CatalogMatrix":
+        return cls.build_from(cls.snapshot(index, products), generation=generation)
+
+    @classmethod
+    def build_from(cls, inputs: "MatrixInputs", *, generation: int) -> "CatalogMatrix":
+        lengths, index_columns, product_categories = inputs
+        doc_ids = np.fromiter(sorted(lengths), dtype=np.int64, count=len(lengths))
+        doc_len = np.fromiter((lengths[int(d)] for d in doc_ids), dtype=np.float64, count=len(doc_ids))
+        n = len(doc_ids)
+        avg_len = float(doc_len.mean()) if n else 1.0
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len / (avg_len or 1.0))
+
+        columns: Dict[str, int] = {}
+        rows_parts: List["np.ndarray"] = []
+        data_parts: List["np.ndarray"] = []
+        indptr = [0]
+        for token, posting, tfs in index_columns:
+            rows = np.searchsorted(doc_ids, np.frombuffer(posting, dtype=np.uint32))
+            tf = np.frombuffer(tfs, dtype=np.float32).astype(np.float64)
+            df = len(rows)
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            order = np.argsort(rows, kind="stable")
+            rows = rows[order]
+            tf = tf[order]
+            rows_parts.append(rows)
+            data_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm[rows]))
+            columns[token] = len(columns)
+            indptr.append(indptr[-1] + df)
+
+        matrix = sparse.csc_matrix(
+            (
+                np.concatenate(data_parts).astype(np.float32) if data_parts else np.zeros(0, np.float32),
+                np.concatenate(rows_parts) if rows_parts else np.zeros(0, np.int64),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(n, len(columns)),
+        )
+
+        by_category: Dict[int, List[int]] = {}
+        for row, pid in enumerate(doc_ids.tolist()):
+            for cid in product_categories.get(pid, ()):
+                by_category.setdefault(cid, []).append(row)
+        category_rows = {cid: np.asarray(rows, dtype=np.int64) for cid, rows in by_category.items()}
+        return cls(doc_ids, columns, matrix, category_rows, generation)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def rows_for(self, pids: Iterable[int]) -> "np.ndarray":
+        ids = np.fromiter(pids, dtype=np.int64)
+        if not len(ids) or not len(self.doc_ids):
+            return np.zeros(0, dtype=np.int64)
+        pos = np.searchsorted(self.doc_ids, ids)
+        pos = np.clip(pos, 0, len(self.doc_ids) - 1)
+        return pos[self.doc_ids[pos] == ids]
+
+    def token_mask(self, tokens: Sequence[str]) -> "np.ndarray":
+        """
+        Máscara de los productos que contienen todos los tokens.
+        """
+        mask = np.zeros(len(self.doc_ids), dtype=bool)
+        for i, token in enumerate(tokens):
+            col = self.columns.get(token)
+            if col is None:
+                return np.zeros(len(self.doc_ids), dtype=bool)
+            rows = self.matrix.indices[self.matrix.indptr[col]:self.matrix.indptr[col + 1]]
+            if i == 0:
+                mask[rows] = True
+            else:
+                present = np.zeros(len(self.doc_ids), dtype=bool)
+                present[rows] = True
+                mask &= present
+        return mask
+
+    def category_mask(self, category_ids: Iterable[int]) -> "np.ndarray":
+        mask = np.zeros(len(self.doc_ids), dtype=bool)
+        for cid in category_ids:
+            rows = self.category_rows.get(cid)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def score(self, tokens: Sequence[str], weights: Optional[Dict[str, float]] = None) -> "np.ndarray":
+        """
+        Vector denso con el score BM25 de cada fila (mismo resultado que InvertedIndex.score).
+        """
+        cols: List[int] = []
+        w: List[float] = []
+        for token in dict.fromkeys(tokens):
+            col = self.columns.get(token)
+            if col is None:
+                continue
+            cols.append(col)
+            w.append(weights.get(token, 1.0) if weights else 1.0)
+        if not cols:
+            return np.zeros(len(self.doc_ids), dtype=np.float32)
+        return np.asarray(self.matrix[:, cols] @ np.asarray(w, dtype=np.float32)).ravel()
+
+    def top_k(self, scores: "np.ndarray", candidates: "np.ndarray", k: int) -> List[Tuple[int, float]]:
+        """
+        Los k mejores (id de producto, score) entre las filas marcadas en `candidates`;
+        los empates se desempatan por id de producto.
+        """
+        rows = np.flatnonzero(candidates)
+        if not len(rows) or k <= 0:
+            return []
+        if len(rows) > k:
+            kth = np.partition(-scores[rows], k - 1)[k - 1]
+            rows = rows[-scores[rows] <= kth]
+        rows = rows[np.lexsort((rows, -scores[rows]))][:k]
+        return [(int(self.doc_ids[r]), float(scores[r])) for r in rows]
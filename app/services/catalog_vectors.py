@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import heapq
+import math
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from app.services.catalog_index import CatalogProduct
+from app.services.query_synonyms import synonym_matcher
+from app.utils.text import STOPWORDS, analyze, analyze_document, stem
+
+_DIMS = 1 << 20              # espacio de hashing (colisiones despreciables para miles de productos)
+_NGRAM_SIZES = (3, 4, 5)
+_WORD_WEIGHT = 2.0           # la raíz completa pesa más que cada n-grama suelto
+_NAME_WEIGHT = 2.0           # el nombre pesa más que categorías y descripción
+_MAX_DF_RATIO = 0.5          # n-gramas presentes en más de la mitad del catálogo no discriminan
+
+_STOP_STEMS = frozenset(stem(w) for w in STOPWORDS)
+
+
+@lru_cache(maxsize=32768)
+def _stem_features(token: str) -> Tuple[Tuple[int, float], ...]:
+    """
+    Features hasheadas de una raíz: la raíz completa y sus n-gramas de caracteres
+    (con borde "<" para distinguir el inicio de palabra). Sin borde final: los
+    sufijos ("ador>", "cion>") los comparten palabras sin relación
+    ("generador" / "clarificador").
+    """
+    padded = f"<{token}"
+    feats = [(zlib.crc32(f"w {token}".encode()) & (_DIMS - 1), _WORD_WEIGHT)]
+    for n in _NGRAM_SIZES:
+        for i in range(len(padded) - n + 1):
+            feats.append((zlib.crc32(padded[i:i + n].encode()) & (_DIMS - 1), 1.0))
+    return tuple(feats)
+
+
+def _add_features(out: Dict[int, float], tokens: Iterable[str], weight: float = 1.0) -> Dict[int, float]:
+    for token in tokens:
+        if token in _STOP_STEMS:
+            continue
+        for feat, w in _stem_features(token):
+            out[feat] = out.get(feat, 0.0) + w * weight
+    return out
+
+
+def _product_features(record: CatalogProduct) -> Dict[int, float]:
+    cats = " ".join(name for _, name, _ in record.categories)
+    feats = _add_features({}, analyze_document(record.name), _NAME_WEIGHT)
+    _add_features(feats, analyze_document(cats))
+    _add_features(feats, analyze_document(record.short_description))
+    # Paráfrasis de los grupos de sinónimos del producto ("alguicida" -> "agua verde", "algas").
+    for phrase in synonym_matcher.match_document(f"{record.name} {cats}").descriptions():
+        _add_features(feats, analyze_document(phrase))
+    return feats
+
+
+class VectorIndex:
+    """
+    Índice vectorial local del catálogo para consultas parafraseadas
+    ("que el agua no se ponga verde" -> alguicidas), sin red en la consulta.
+
+    Cada producto es un vector TF-IDF disperso de n-gramas de caracteres
+    hasheados (más sus raíces completas) de nombre, categorías y descripción,
+    enriquecido con las paráfrasis (`describe`) de sus grupos de sinónimos.
+    La similitud es coseno; la búsqueda recorre solo las postings de las
+    features de la consulta, así que tarda milisegundos con miles de productos.
+
+    Se arma completo (el idf depende de todo el catálogo) en un hilo aparte
+    cada vez que cambia el texto indexado, igual que CatalogMatrix.
+    """
+
+    def __init__(self, generation: int = 0) -> None:
+        self.generation = generation
+        self.doc_ids: List[int] = []
+        self._idf: Dict[int, float] = {}
+        self._postings: Dict[int, Tuple[array, array]] = {}
+
+    @classmethod
+    def build(cls, products: Mapping[int, CatalogProduct], *, generation: int) -> "VectorIndex":
+        index = cls(generation)
+        docs = [(pid, _product_features(record)) for pid, record in products.items()]
+        n = len(docs)
+        df: Dict[int, int] = {}
+        for _, feats in docs:
+            for feat in feats:
+                df[feat] = df.get(feat, 0) + 1
+        max_df = max(1, int(n * _MAX_DF_RATIO))
+        index._idf = {
+            feat: math.log((1.0 + n) / (1.0 + count)) + 1.0 for feat, count in df.items() if count <= max_df
+        }
+
+        rows: Dict[int, Tuple[array, array]] = {}
+        for row, (pid, feats) in enumerate(docs):
+            index.doc_ids.append(pid)
+            weighted = {
+                feat: (1.0 + math.log(tf)) * index._idf[feat] for feat, tf in feats.items() if feat in index._idf
+            }
+            norm = math.sqrt(sum(w * w for w in weighted.values())) or 1.0
+            for feat, w in weighted.items():
+                posting = rows.get(feat)
+                if posting is None:
+                    posting = rows[feat] = (array("I"), array("f"))
+                posting[0].append(row)
+                posting[1].append(w / norm)
+        index._postings = rows
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def _query_vector(self, text: str) -> Dict[int, float]:
+        feats = _add_features({}, analyze(text))
+        weighted = {feat: (1.0 + math.log(tf)) * self._idf[feat] for feat, tf in feats.items() if feat in self._idf}
+        norm = math.sqrt(sum(w * w for w in weighted.values())) or 1.0
+        return {feat: w / norm for feat, w in weighted.items()}
+
+    def search(
+        self,
+        text: str,
+        *,
+        limit: int = 20,
+        min_score: float = 0.0,
+        allowed: Optional[Iterable[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Los `limit` productos más parecidos a `text` como (id, similitud coseno).
+        `allowed` restringe a esos ids de producto.
+        """
+        query = self._query_vector(text)
+        if not query or not self.doc_ids:
+            return []
+        scores = [0.0] * len(self.doc_ids)
+        for feat, qw in query.items():
+            rows, weights = self._postings[feat]
+            for row, dw in zip(rows, weights):
+                scores[row] += qw * dw
+        if allowed is not None:
+            keep = set(allowed)
+            candidates = ((s, row) for row, s in enumerate(scores) if s > min_score and self.doc_ids[row] in keep)
+        else:
+            candidates = ((s, row) for row, s in enumerate(scores) if s > min_score)
+        return [(self.doc_ids[row], s) for s, row in heapq.nlargest(limit, candidates)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.doc_ids),
+            "features": len(self._postings),
+            "postings": sum(len(rows) for rows, _ in self._postings.values()),
+        }
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.utils.text import fold
+
+
+class CategoryTree:
+    """
+    Árbol completo de categorías de producto de WooCommerce en memoria.
+
+    Lo carga catalog_cache junto con cada sincronización del catálogo; mientras no
+    esté cargado (`loaded` es False) los llamadores caen a la API como antes.
+
+    Por categoría guarda id, name, slug, parent y count; además precalcula los
+    ancestros (de la raíz hacia el padre) y el subárbol de cada nodo.
+    """
+
+    def __init__(self) -> None:
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._id_by_slug: Dict[str, int] = {}
+        self._children: Dict[int, List[int]] = {}
+        self._ancestors: Dict[int, Tuple[int, ...]] = {}
+        self._subtree: Dict[int, FrozenSet[int]] = {}
+        self.loaded_at: float = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._by_id)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def replace(self, categories: List[Dict[str, Any]]) -> None:
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for c in categories:
+            cid = c.get("id") if isinstance(c, dict) else None
+            if not isinstance(cid, int):
+                continue
+            parent = c.get("parent")
+            by_id[cid] = {
+                "id": cid,
+                "name": c.get("name") or "",
+                "slug": c.get("slug") or "",
+                "parent": parent if isinstance(parent, int) else 0,
+                "count": c.get("count"),
+            }
+
+        children: Dict[int, List[int]] = {}
+        for cid, c in by_id.items():
+            children.setdefault(c["parent"], []).append(cid)
+
+        ancestors: Dict[int, Tuple[int, ...]] = {}
+        for cid in by_id:
+            chain: List[int] = []
+            seen = {cid}
+            parent = by_id[cid]["parent"]
+            # `seen` corta ciclos si Woo devolviera un parent inconsistente.
+            while parent in by_id and parent not in seen:
+                chain.append(parent)
+                seen.add(parent)
+                parent = by_id[parent]["parent"]
+            ancestors[cid] = tuple(reversed(chain))
+
+        subtree: Dict[int, set[int]] = {cid: {cid} for cid in by_id}
+        for cid, chain in ancestors.items():
+            for ancestor in chain:
+                subtree[ancestor].add(cid)
+
+        self._by_id = by_id
+        self._id_by_slug = {c["slug"]: cid for cid, c in by_id.items() if c["slug"]}
+        self._children = children
+        self._ancestors = ancestors
+        self._subtree = {cid: frozenset(ids) for cid, ids in subtree.items()}
+        self.loaded_at = time.time()
+
+    def get(self, category_id: int) -> Optional[Dict[str, Any]]:
+        c = self._by_id.get(category_id)
+        return dict(c) if c is not None else None
+
+    def id_for_slug(self, slug: str) -> Optional[int]:
+        return self._id_by_slug.get((slug or "").strip().lower())
+
+    def resolve(self, category: Any) -> Optional[int]:
+        """
+        Acepta un id (int o dígitos) o un slug y devuelve el id si existe.
+        """
+        if isinstance(category, int):
+            return category if category in self._by_id else None
+        raw = str(category or "").strip()
+        if raw.isdigit() and int(raw) in self._by_id:
+            return int(raw)
+        return self.id_for_slug(raw)
+
+    def ancestors(self, category_id: int) -> List[Dict[str, Any]]:
+        return [dict(self._by_id[a]) for a in self._ancestors.get(category_id, ())]
+
+    def subtree_ids(self, category_id: int) -> FrozenSet[int]:
+        """
+        La categoría y todas sus descendientes (vacío si no existe).
+        """
+        return self._subtree.get(category_id, frozenset())
+
+    def children(self, parent: int) -> List[Dict[str, Any]]:
+        return [dict(self._by_id[cid]) for cid in self._children.get(parent, [])]
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [dict(c) for c in self._by_id.values()]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Equivalente local de /products/categories?search= (nombre o slug).
+        """
+        q = fold(query)
+        if not q:
+            return []
+        slug_q = q.replace(" ", "-")
+        out: List[Dict[str, Any]] = []
+        for c in self._by_id.values():
+            if q in fold(c["name"]) or slug_q in c["slug"]:
+                out.append(dict(c))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "categories": len(self._by_id),
+            "roots": len(self._children.get(0, [])),
+            "loaded_at": self.loaded_at or None,
+        }
+
+
+category_tree = CategoryTree()
@@ -5,6 +5,7 @@ import httpx
 from httpx import HTTPStatusError
 
 from app.core.settings import get_settings
+from app.services.resilience import call_upstream
 
 logger = logging.getLogger(__name__)
 
@@ -50,26 +51,33 @@ class ClientifyClient:
         *,
         params: Optional[Dict[str, Any]] = None,
         json: Optional[Dict[str, Any]] = None,
-        timeout: float = 15.0,
+        timeout: Optional[float] = None,
     ) -> Any:
         """
         Envoltorio común para peticiones HTTP a Clientify.
-        Lanza HTTPStatusError si la respuesta no es 2xx.
+        Lanza HTTPStatusError si la respuesta no es 2xx y CircuitOpenError
+        si Clientify viene fallando (breaker abierto).
+
+        Sin `timeout` explícito se usa el timeout adaptativo del upstream.
         """
         url = self._build_url(path)
 
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.request(
-                method=method.upper(),
-                url=url,
-                headers=self.headers,
-                params=params,
-                json=json,
-            )
+        async def _do(adaptive_timeout: float) -> httpx.Response:
+            async with httpx.AsyncClient(timeout=timeout or adaptive_timeout) as client:
+                resp = await client.request(
+                    method=method.upper(),
+                    url=url,
+                    headers=self.headers,
+                    params=params,
+                    json=json,
+                )
+            resp.raise_for_status()
+            return resp
 
         try:
-            response.raise_for_status()
-        except HTTPStatusError:
+            response = await call_upstream("clientify", _do)
+        except HTTPStatusError as exc:
+            response = exc.response
             # Logueamos detalle para debug
             logger.error(
                 "Error en petición a Clientify",
@@ -1,8 +1,7 @@
 import asyncio
 import logging
 import re
-import unicodedata
-from typing import Optional
+from typing import Awaitable, Optional
 
 from app.services.clientify import clientify_client
 from app.services.playbook_router import (
@@ -12,7 +11,7 @@ from app.services.playbook_router import (
     WELCOME_MESSAGE,
 )
 from app.services.product_search import smart_product_search, format_products_reply
-from app.services.woocommerce import woocommerce_client
+from app.services.catalog_cache import lookup_product_by_sku
 from app.services.session_state import (
     get_line_hint,
     set_line_hint,
@@ -31,6 +30,7 @@ from app.services.session_state import (
     mark_user_activity,
 )
 from app.services.openai_consultant import select_consultant_question
+from app.services.resilience import deadline_after, remaining_budget, without_deadline
 from app.services.intent_router import route_info_request
 from app.services.openai_intent import classify_info_intent
 from app.services.info_responder import build_info_response
@@ -42,6 +42,7 @@ from app.services.knowledge_base import (
 from app.utils.time import is_weekend_now, time_greeting
 from app.utils.formatting import format_cop
 from app.utils.test_mode import prefix_with_test_tag
+from app.utils.text import normalize
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +52,9 @@ INTENT_TIMEOUT_SECONDS = 4.0
 CONSULT_TIMEOUT_SECONDS = 4.0
 SKU_TIMEOUT_SECONDS = 5.0
 SEARCH_TIMEOUT_SECONDS = 8.0
+# Presupuesto de todo el turno: acota timeouts y reintentos de cada paso (intent, SKU,
+# consultiva, búsqueda) contra Woo/OpenAI, además del límite propio de cada uno.
+TURN_TIMEOUT_SECONDS = 15.0
 
 INVENTORY_ERROR_REPLY = (
     "En este momento no puedo consultar el inventario. "
@@ -72,6 +76,25 @@ def _extract_sku_from_text(text: str) -> Optional[str]:
     return match.group(1) if match else None
 
 
+def _variation_stock_line(variations: list) -> str:
+    """
+    Resumen corto del stock por opción de un producto variable (voltaje, tamaño, ...).
+    """
+    status_map = {"instock": "disponible", "outofstock": "agotado", "onbackorder": "bajo pedido"}
+    parts = []
+    for v in variations[:6]:
+        label = " / ".join((v.get("attributes") or {}).values()) or (v.get("sku") or "opción")
+        qty = v.get("stock_quantity")
+        if v.get("manage_stock") and qty is not None:
+            state = f"{qty} und."
+        else:
+            state = status_map.get(v.get("stock_status") or "", "sin confirmar")
+        parts.append(f"{label}: {state}")
+    if not parts:
+        return ""
+    return "Por opción: " + "; ".join(parts) + "."
+
+
 async def _sync_clientify(phone: str, text: str) -> None:
     """
     Sincroniza el mensaje con Clientify sin bloquear la respuesta al usuario.
@@ -118,20 +141,8 @@ def _with_greeting(phone: str, text: str) -> str:
     return f"{greeting}. {text}"
 
 
-def _normalize_intent(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch
-        for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"[^a-z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t)
-    return t
-
-
 def _is_only_greeting(text: str) -> bool:
-    norm = _normalize_intent(text)
+    norm = normalize(text)
     if not norm:
         return True
     greetings = {
@@ -170,7 +181,7 @@ def _is_only_greeting(text: str) -> bool:
 
 
 def _is_reset_request(text: str) -> bool:
-    norm = _normalize_intent(text)
+    norm = normalize(text)
     if not norm:
         return False
     triggers = {
@@ -233,7 +244,7 @@ def _extract_name_and_remainder(text: str) -> tuple[Optional[str], str]:
 
 
 def _is_more_options_request(text: str) -> bool:
-    norm = _normalize_intent(text)
+    norm = normalize(text)
     if not norm:
         return False
     triggers = [
@@ -249,6 +260,20 @@ def _is_more_options_request(text: str) -> bool:
     return any(t in norm for t in triggers)
 
 
+def _step_timeout(limit: float) -> float:
+    """
+    Timeout de un paso del turno: su límite propio o lo que quede del presupuesto del turno.
+    """
+    remaining = remaining_budget()
+    return limit if remaining is None else max(0.0, min(limit, remaining))
+
+
+async def _in_background(coro: Awaitable[None]) -> None:
+    # Las tareas lanzadas dentro del turno heredan su contexto; no deben cortarse con él.
+    with without_deadline():
+        await coro
+
+
 async def process_incoming_message(phone: str, text: str, *, channel: str = "meta") -> str:
     logger.info("Procesando mensaje entrante de WhatsApp", extra={"phone": phone, "text": text})
     mark_user_activity(phone, channel=channel)
@@ -256,6 +281,11 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
     # 1) Clientify en segundo plano para no bloquear la respuesta
     asyncio.create_task(_sync_clientify(phone, text))
 
+    with deadline_after(TURN_TIMEOUT_SECONDS):
+        return await _handle_turn(phone, text)
+
+
+async def _handle_turn(phone: str, text: str) -> str:
     name_prefix: Optional[str] = None
     detected_name, name_remainder = _extract_name_and_remainder(text)
     if detected_name:
@@ -341,14 +371,15 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
             clear_last_candidates(phone)
             clear_search_pool(phone)
             return _respond(kb.answer)
-        asyncio.create_task(record_gap_and_draft(text, line_hint=hint))
+        asyncio.create_task(_in_background(record_gap_and_draft(text, line_hint=hint)))
 
     # 4) OpenAI intent (info/servicios/lineas/catalogo) si aplica
     try:
-        intent_result = await asyncio.wait_for(
-            classify_info_intent(text, line_hint=hint),
-            timeout=INTENT_TIMEOUT_SECONDS,
-        )
+        with deadline_after(INTENT_TIMEOUT_SECONDS):
+            intent_result = await asyncio.wait_for(
+                classify_info_intent(text, line_hint=hint),
+                timeout=_step_timeout(INTENT_TIMEOUT_SECONDS),
+            )
     except asyncio.TimeoutError:
         intent_result = None
     if intent_result:
@@ -371,10 +402,11 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
         clear_last_candidates(phone)
         clear_search_pool(phone)
         try:
-            product = await asyncio.wait_for(
-                woocommerce_client.get_product_by_sku(sku),
-                timeout=SKU_TIMEOUT_SECONDS,
-            )
+            with deadline_after(SKU_TIMEOUT_SECONDS):
+                product = await asyncio.wait_for(
+                    lookup_product_by_sku(sku),
+                    timeout=_step_timeout(SKU_TIMEOUT_SECONDS),
+                )
         except asyncio.TimeoutError:
             return _respond(
                 "Estoy revisando el catálogo de Aqua Integral y tomó más tiempo del esperado. "
@@ -408,6 +440,9 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
                 "onbackorder": "Actualmente aparece como en pedido pendiente.",
             }
             stock_part = status_map.get(stock_status or "", "Actualmente no puedo confirmar el stock exacto.")
+        variations_part = _variation_stock_line(product.get("variations") or [])
+        if variations_part:
+            stock_part = f"{stock_part} {variations_part}"
 
         price_part = f" El precio actual es {format_cop(price)}." if price else ""
         reply_text = (
@@ -420,10 +455,11 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
     # 6) Pregunta consultiva (OpenAI) si falta contexto
     asked = get_consult_questions(phone)
     try:
-        choice = await asyncio.wait_for(
-            select_consultant_question(text, line_hint=hint, asked_keys=asked),
-            timeout=CONSULT_TIMEOUT_SECONDS,
-        )
+        with deadline_after(CONSULT_TIMEOUT_SECONDS):
+            choice = await asyncio.wait_for(
+                select_consultant_question(text, line_hint=hint, asked_keys=asked),
+                timeout=_step_timeout(CONSULT_TIMEOUT_SECONDS),
+            )
     except asyncio.TimeoutError:
         choice = None
     if choice:
@@ -441,10 +477,12 @@ async def process_incoming_message(phone: str, text: str, *, channel: str = "met
 
     # 8) Búsqueda inteligente por texto (siempre Woo + rerank)
     try:
-        reply_text, selected, pool = await asyncio.wait_for(
-            smart_product_search(text, line_hint=hint),
-            timeout=SEARCH_TIMEOUT_SECONDS,
-        )
+        # El presupuesto acota también los reintentos contra Woo/OpenAI dentro de la búsqueda.
+        with deadline_after(SEARCH_TIMEOUT_SECONDS):
+            reply_text, selected, pool = await asyncio.wait_for(
+                smart_product_search(text, line_hint=hint),
+                timeout=_step_timeout(SEARCH_TIMEOUT_SECONDS),
+            )
     except asyncio.TimeoutError:
         return _respond(
             "Estoy revisando el catálogo de Aqua Integral y tomó más tiempo del esperado. "
@@ -1,23 +1,10 @@
 from __future__ import annotations
 
-import re
-import unicodedata
 from typing import Optional
 
 from app.domain import playbook as pb
 from app.domain.catalog_links import CATALOG_URLS, GENERAL_CATALOG_URL
-
-
-def _normalize(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch
-        for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"[^a-z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t)
-    return t
+from app.utils.text import normalize
 
 
 def _has_any(norm: str, tokens: list[str]) -> bool:
@@ -30,7 +17,7 @@ def _is_placeholder(text: str) -> bool:
 
 def _catalog_url_for_line(line_hint: Optional[str], text_norm: str) -> str:
     if line_hint:
-        norm = _normalize(line_hint)
+        norm = normalize(line_hint)
         for key, url in CATALOG_URLS.items():
             if key in norm:
                 return url
@@ -45,7 +32,7 @@ def route_info_request(text: str, *, line_hint: Optional[str]) -> Optional[str]:
     Respuestas directas a preguntas comunes (link, horario, ubicacion, pagos).
     Si no aplica, retorna None.
     """
-    norm = _normalize(text)
+    norm = normalize(text)
     if not norm:
         return None
 
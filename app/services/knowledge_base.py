@@ -2,8 +2,6 @@ from __future__ import annotations
 
 import asyncio
 import json
-import re
-import unicodedata
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
@@ -11,6 +9,7 @@ from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from app.core.settings import get_settings
 from app.services.openai_kb_draft import generate_kb_draft
+from app.utils.text import STOPWORDS, normalize, stem, tokenize
 
 
 _BASE_PATH = Path(__file__).resolve().parents[1] / "domain" / "knowledge_base.json"
@@ -23,54 +22,6 @@ _cache_entries: List[Dict[str, Any]] = []
 
 _write_lock = asyncio.Lock()
 
-_STOPWORDS = {
-    "a",
-    "al",
-    "algo",
-    "alguien",
-    "as",
-    "con",
-    "como",
-    "cual",
-    "cuando",
-    "de",
-    "del",
-    "donde",
-    "el",
-    "ella",
-    "ellos",
-    "en",
-    "es",
-    "esta",
-    "estoy",
-    "fue",
-    "ha",
-    "hola",
-    "las",
-    "lo",
-    "los",
-    "la",
-    "me",
-    "mi",
-    "mis",
-    "necesito",
-    "quiero",
-    "que",
-    "para",
-    "por",
-    "ser",
-    "si",
-    "sin",
-    "su",
-    "sus",
-    "una",
-    "un",
-    "unos",
-    "unas",
-    "y",
-    "o",
-}
-
 _INFO_HINTS = {
     "aqua",
     "aquaintegral",
@@ -112,28 +63,12 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _normalize(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch
-        for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"[^a-z0-9\\s]", " ", t)
-    t = re.sub(r"\\s+", " ", t)
-    return t
-
-
 def _tokenize(text: str) -> List[str]:
-    norm = _normalize(text)
-    if not norm:
-        return []
-    parts = re.findall(r"[a-z0-9]+", norm)
-    return [p for p in parts if len(p) >= 3 and p not in _STOPWORDS]
+    return [stem(t) for t in tokenize(text) if t not in STOPWORDS]
 
 
 def should_attempt_knowledge(text: str) -> bool:
-    norm = _normalize(text)
+    norm = normalize(text)
     if not norm:
         return False
     return any(h in norm for h in _INFO_HINTS)
@@ -234,10 +169,10 @@ def _append_jsonl(path: Path, payload: Dict[str, Any]) -> None:
 
 
 def _slugify(text: str) -> str:
-    norm = _normalize(text)
+    norm = normalize(text)
     if not norm:
         return "kb"
-    norm = re.sub(r"\\s+", "-", norm).strip("-")
+    norm = norm.replace(" ", "-").strip("-")
     return norm[:64] or "kb"
 
 
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.text import fold
+
+# (atributo, regex de la unidad, factor a la unidad canónica, admite fracciones "1/2").
+# El orden importa: las unidades compuestas van antes que sus prefijos (l/min antes que l).
+# "m3" suelto no se toma como capacidad: en las consultas suele ser el volumen de la piscina.
+_UNITS: Tuple[Tuple[str, str, float, bool], ...] = (
+    ("flow_m3h", r"m3\s*/\s*h(?:ora)?|m3h|metros?\s+cubicos?\s+(?:por|/)\s*hora", 1.0, False),
+    ("flow_m3h", r"l\s*/\s*min|lpm|litros?\s+(?:por|/)\s*minuto", 0.06, False),
+    ("flow_m3h", r"l\s*/\s*h|lph|litros?\s+(?:por|/)\s*hora", 0.001, False),
+    ("flow_m3h", r"gpm|galones\s+por\s+minuto", 0.2271, False),
+    ("hp", r"hp|caballos?(?:\s+de\s+fuerza)?", 1.0, True),
+    ("voltage", r"v|vac|voltios?|volts?", 1.0, False),
+    ("btu", r"btu(?:\s*/\s*h)?", 1.0, False),
+    ("head_mca", r"mca|m\.c\.a\.?|metros?\s+de\s+columna\s+de\s+agua", 1.0, False),
+    ("head_mca", r"psi", 0.7031, False),
+    ("liters", r"litros?|lts?|l", 1.0, False),
+    ("liters", r"galon(?:es)?|gal", 3.785, False),
+)
+
+# Unidad canónica de cada atributo (para mostrar y para completar opciones sin unidad).
+ATTRIBUTE_UNITS: Dict[str, str] = {
+    "hp": "HP",
+    "voltage": "V",
+    "flow_m3h": "m3/h",
+    "btu": "BTU",
+    "liters": "L",
+    "head_mca": "mca",
+    "phase": "fases",
+}
+
+_NUM = r"\d+(?:[.,]\d+)*"
+_CMP_MIN = r"mas\s+de|mayor(?:es)?\s+(?:a|de|que)|minimo|min|al\s+menos|desde|sobre|superior(?:es)?\s+a|>=?"
+_CMP_MAX = r"menos\s+de|menor(?:es)?\s+(?:a|de|que)|maximo|max|hasta|inferior(?:es)?\s+a|<=?"
+
+_VALUE_RE = re.compile(
+    rf"(?:(?P<min>{_CMP_MIN})\s*|(?P<max>{_CMP_MAX})\s*)?"
+    rf"(?:(?P<lo>{_NUM})\s*(?:a|-|y|al|hasta)\s*)?"
+    rf"(?<![\w.,])(?:(?P<whole>\d+)\s+)?(?P<nums>{_NUM}(?:\s*/\s*{_NUM})*)\s*"
+    rf"(?:{'|'.join(f'(?P<u{i}>{pattern})' for i, (_, pattern, _, _) in enumerate(_UNITS))})"
+    r"(?![a-z0-9])"
+)
+
+_PHASE_RE = re.compile(r"\b(mono|bi|tri)fasic[oa]s?\b")
+_PHASES = {"mono": 1.0, "bi": 2.0, "tri": 3.0}
+
+# Nombres de atributo de Woo que fijan la unidad de opciones sin unidad ("Voltaje: 110").
+_ATTRIBUTE_NAME_UNITS: Tuple[Tuple[str, str], ...] = (
+    ("volt", "v"),
+    ("potencia", "hp"),
+    ("hp", "hp"),
+    ("caballo", "hp"),
+    ("btu", "btu"),
+)
+
+# Atributos donde "1.500" es siempre decimal (ver _is_thousands).
+_DECIMAL_ONLY_ATTRS = frozenset({"hp", "voltage", "phase"})
+
+# En una consulta, litros/galones solo filtran si hablan del producto ("tanque de 500 L",
+# "garrafa de 20 litros"): sin esa pista suelen ser el volumen de la piscina o del tanque del cliente.
+_CAPACITY_CUE_RE = re.compile(
+    r"\b(?:capacidad|tanques?|garrafas?|garrafon|bidon(?:es)?|canecas?|cunetes?|envases?|"
+    r"presentacion(?:es)?|recipientes?|contenedor(?:es)?|baldes?|tambor(?:es)?)\b"
+)
+_CAPACITY_CUE_WINDOW = 30  # caracteres antes de la medida donde se busca la pista
+
+# Tolerancia para un valor puntual de la consulta ("1 HP", "220V").
+EXACT_TOLERANCE = 0.05
+
+
+def _is_thousands(s: str, attr: Optional[str]) -> bool:
+    """
+    ¿"[.,]ddd" separa miles? Con dos o más grupos siempre ("1.000.000"). Con uno
+    depende de la unidad: BTU siempre ("12.000"), HP/voltios/fases nunca, y el
+    resto (litros, caudal, mca) solo si termina en 0 ("1.000 L", "2.500 L/h"),
+    porque "3.785 L" (un galón) es un decimal.
+    """
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3}){2,}", s):
+        return True
+    if not re.fullmatch(r"\d{1,3}[.,]\d{3}", s):
+        return False
+    if attr == "btu" or attr is None:
+        return True
+    if attr in _DECIMAL_ONLY_ATTRS:
+        return False
+    return s.endswith("0")
+
+
+def _parse_number(raw: str, attr: Optional[str] = None) -> Optional[float]:
+    """
+    "50.000" / "50,000" -> 50000 (miles); "1.5" / "1,5" -> 1.5 (ver _is_thousands).
+    """
+    s = raw.strip()
+    if _is_thousands(s, attr):
+        return float(re.sub(r"[.,]", "", s))
+    s = s.replace(",", ".")
+    if s.count(".") > 1:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _values(nums: str, whole: Optional[str], fractions: bool, attr: Optional[str] = None) -> List[float]:
+    parts = [p.strip() for p in nums.split("/")]
+    if fractions and len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+        num, den = int(parts[0]), int(parts[1])
+        if den in (2, 4, 8, 16) and 0 < num < den:
+            return [num / den + (int(whole) if whole else 0)]
+    out: List[float] = []
+    for p in parts:
+        v = _parse_number(p, attr)
+        if v is not None:
+            out.append(v)
+    return out
+
+
+def _iter_values(norm: str):
+    """
+    (atributo, valores, comparador, límite inferior, inicio) por cada medida del texto.
+    """
+    for m in _VALUE_RE.finditer(norm):
+        unit_idx = next(i for i in range(len(_UNITS)) if m.group(f"u{i}") is not None)
+        attr, _, factor, fractions = _UNITS[unit_idx]
+        values = [round(v * factor, 4) for v in _values(m.group("nums"), m.group("whole"), fractions, attr)]
+        if not values:
+            continue
+        lo = _parse_number(m.group("lo"), attr) if m.group("lo") else None
+        cmp = "min" if m.group("min") else "max" if m.group("max") else None
+        yield attr, values, cmp, (round(lo * factor, 4) if lo is not None else None), m.start()
+
+
+def extract_numeric_attributes(text: str) -> Dict[str, List[float]]:
+    """
+    Medidas de un texto de producto, por atributo canónico (HP, V, m3/h, BTU, L, mca, fases).
+    """
+    norm = fold(text)
+    out: Dict[str, List[float]] = {}
+    if not norm:
+        return out
+    for attr, values, _, lo, _ in _iter_values(norm):
+        bucket = out.setdefault(attr, [])
+        for v in ([lo] if lo is not None else []) + values:
+            if v not in bucket:
+                bucket.append(v)
+    for m in _PHASE_RE.finditer(norm):
+        bucket = out.setdefault("phase", [])
+        if _PHASES[m.group(1)] not in bucket:
+            bucket.append(_PHASES[m.group(1)])
+    return out
+
+
+def product_numeric_attributes(p: Dict[str, Any]) -> Dict[str, List[float]]:
+    """
+    Medidas de un producto de Woo: nombre, descripción corta y atributos.
+    Las opciones sin unidad se completan con la unidad que sugiere el nombre del atributo.
+    """
+    parts = [str(p.get("name") or ""), str(p.get("short_description") or "")]
+    for a in p.get("attributes") or []:
+        if not isinstance(a, dict):
+            continue
+        name = fold(str(a.get("name") or ""))
+        unit = next((u for key, u in _ATTRIBUTE_NAME_UNITS if key in name), "")
+        for option in a.get("options") or []:
+            option = str(option)
+            if unit and re.fullmatch(r"[\d.,/\s]+", option):
+                option = f"{option} {unit}"
+            parts.append(option)
+    return extract_numeric_attributes(" \n ".join(parts))
+
+
+@dataclass(frozen=True)
+class NumericFilter:
+    """
+    Restricción numérica de una consulta: el producto cumple si alguno de sus
+    valores del atributo cae en alguno de los rangos (cerrados).
+    """
+
+    attr: str
+    ranges: Tuple[Tuple[float, float], ...]
+
+    def matches(self, values: Iterable[float]) -> bool:
+        return any(lo <= v <= hi for v in values for lo, hi in self.ranges)
+
+    def describe(self) -> str:
+        unit = ATTRIBUTE_UNITS.get(self.attr, "")
+        chunks = []
+        for lo, hi in self.ranges:
+            if math.isinf(hi):
+                chunks.append(f">= {lo:g} {unit}")
+            elif math.isinf(lo):
+                chunks.append(f"<= {hi:g} {unit}")
+            else:
+                chunks.append(f"{lo:g}-{hi:g} {unit}")
+        return " o ".join(chunks)
+
+
+def parse_numeric_filters(text: str) -> List[NumericFilter]:
+    """
+    Restricciones de la consulta del cliente:
+    "1 a 1.5 HP" -> [1, 1.5]; "más de 2 HP" -> [2, inf); "220V" -> 220 ± 5 %;
+    "110/220V" -> cualquiera de los dos; "monofásica" -> 1 fase.
+    Litros/galones solo con una pista de capacidad ("tanque de 1.000 L").
+    """
+    norm = fold(text)
+    if not norm:
+        return []
+    ranges: Dict[str, List[Tuple[float, float]]] = {}
+    for attr, values, cmp, lo, start in _iter_values(norm):
+        if attr == "liters" and not _CAPACITY_CUE_RE.search(norm, max(0, start - _CAPACITY_CUE_WINDOW), start):
+            # "piscina de 40.000 litros" describe la instalación, no el producto.
+            continue
+        bucket = ranges.setdefault(attr, [])
+        if lo is not None:
+            bucket.append((min(lo, values[-1]), max(lo, values[-1])))
+        elif cmp == "min":
+            bucket.append((min(values), math.inf))
+        elif cmp == "max":
+            bucket.append((-math.inf, max(values)))
+        else:
+            for v in values:
+                bucket.append((round(v * (1 - EXACT_TOLERANCE), 4), round(v * (1 + EXACT_TOLERANCE), 4)))
+    for m in _PHASE_RE.finditer(norm):
+        phase = _PHASES[m.group(1)]
+        ranges.setdefault("phase", []).append((phase, phase))
+    return [NumericFilter(attr=attr, ranges=tuple(dict.fromkeys(rs))) for attr, rs in ranges.items() if rs]
+
+
+def matches_numeric(values: Dict[str, Sequence[float]], filters: Sequence[NumericFilter]) -> bool:
+    """
+    True si el producto no contradice ningún filtro: un atributo que el producto
+    no declara no lo descarta (muchas fichas no traen voltaje o caudal).
+    """
+    for f in filters:
+        own = values.get(f.attr)
+        if own and not f.matches(own):
+            return False
+    return True
+
+
+def strip_measures(text: str) -> str:
+    """
+    Texto normalizado sin las medidas ya interpretadas ("bomba 1 hp 220v" -> "bomba"),
+    para que no se exijan como términos literales.
+    """
+    norm = _VALUE_RE.sub(" ", fold(text))
+    return re.sub(r"\s+", " ", _PHASE_RE.sub(" ", norm)).strip()
@@ -5,10 +5,9 @@ import os
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
-import httpx
-
 from app.core.settings import get_settings
 from app.domain.consultant_questions import normalize_line_hint, questions_for_line
+from app.services.resilience import post_json
 
 
 @dataclass(frozen=True)
@@ -134,10 +133,8 @@ async def select_consultant_question(
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            data = r.json()
+        r = await post_json("openai", url, headers=headers, payload=payload)
+        data = r.json()
     except Exception:
         return None
 
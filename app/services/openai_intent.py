@@ -5,10 +5,9 @@ import os
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-import httpx
-
 from app.core.settings import get_settings
 from app.domain.company_profile import BUSINESS_LINES, normalize_line_key
+from app.services.resilience import post_json
 
 
 @dataclass(frozen=True)
@@ -160,10 +159,8 @@ async def classify_info_intent(
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            data = r.json()
+        r = await post_json("openai", url, headers=headers, payload=payload)
+        data = r.json()
     except Exception:
         return None
 
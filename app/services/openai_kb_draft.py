@@ -4,9 +4,8 @@ import json
 import os
 from typing import Any, Dict, List, Optional
 
-import httpx
-
 from app.core.settings import get_settings
+from app.services.resilience import post_json
 
 
 def _supports_temperature(model: str) -> bool:
@@ -88,10 +87,8 @@ async def generate_kb_draft(
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     url = "https://api.openai.com/v1/responses"
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = await post_json("openai", url, headers=headers, payload=payload)
+    data = r.json()
 
     text = data.get("output_text")
     if not text and isinstance(data.get("output"), list):
@@ -2,9 +2,8 @@ import json
 import os
 from typing import Any, Dict, List, Optional
 
-import httpx
-
 from app.core.settings import get_settings
+from app.services.resilience import post_json
 
 OPENAI_BASE_URL = "https://api.openai.com/v1"
 settings = get_settings()
@@ -144,10 +143,8 @@ async def build_product_search_plan(user_text: str) -> Dict[str, Any]:
         "Content-Type": "application/json",
     }
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(url, headers=headers, json=body)
-        r.raise_for_status()
-        data = r.json()
+    r = await post_json("openai", url, headers=headers, payload=body)
+    data = r.json()
 
     text = _extract_text_from_responses_api(data)
     plan = json.loads(text)
@@ -5,7 +5,7 @@ import os
 import re
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import httpx
+from app.services.resilience import post_json
 
 try:
     from app.core.settings import get_settings  # opcional (si existe)
@@ -147,10 +147,8 @@ async def rerank_products(
     url = "https://api.openai.com/v1/responses"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = await post_json("openai", url, headers=headers, payload=payload)
+    data = r.json()
 
     txt = _extract_output_text(data)
     if not txt:
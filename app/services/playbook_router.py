@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import re
-import unicodedata
 from dataclasses import dataclass
 from typing import Optional
 
@@ -9,6 +8,8 @@ from app.services.session_state import set_line_hint, clear_last_candidates
 
 # Import seguro (no revienta si faltan constantes)
 from app.domain import playbook as pb
+from app.services.query_synonyms import match_query
+from app.utils.text import normalize
 
 
 WELCOME_MESSAGE = getattr(pb, "WELCOME_MESSAGE", "Responde 1-5 para elegir una línea.")
@@ -30,18 +31,6 @@ class PlaybookResult:
     reply: str
 
 
-def _normalize(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch
-        for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"[^a-z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t)
-    return t
-
-
 def _is_greeting(norm: str) -> bool:
     greetings = {
         "hola",
@@ -122,46 +111,32 @@ def infer_line_hint_from_text(text: str) -> Optional[str]:
     """
     Inferencia suave de línea a partir de palabras clave (sin responder).
     """
-    norm = _normalize(text)
-    if not norm:
-        return None
-
-    if "piscin" in norm:
-        return "piscinas"
-    if "bomba" in norm or "bombeo" in norm:
-        return "bombeo"
-    if "residual" in norm or "aguas residuales" in norm:
-        return "agua residual"
-    if "potable" in norm or "industrial" in norm:
-        return "agua potable"
-    if "analisis" in norm or "medicion" in norm or "laboratorio" in norm:
-        return "analisis"
-    return None
+    return match_query(text).line
 
 
 def clarify_question_for_text(text: str, *, line_hint: Optional[str]) -> Optional[str]:
     """
     Preguntas cortas para desambiguar solicitudes muy genericas.
     """
-    norm = _normalize(text)
-    if not norm:
+    match = match_query(text)
+    if not match.groups:
         return None
 
-    if line_hint is None and ("bomba" in norm or "bombeo" in norm):
+    if line_hint is None and match.has("bomba"):
         return (
             "Para ayudarte con la bomba, ¿es para piscina, agua potable o residual? "
             "Si tienes caudal/altura o HP, cuéntamelo."
         )
 
-    if line_hint is None and ("filtro" in norm or "filtracion" in norm or "filtración" in norm):
-        if not any(k in norm for k in ("arena", "cartucho", "carb", "piscin")):
+    if line_hint is None and match.has("filtro"):
+        if not match.has("arena", "cartucho", "carbon", "piscina"):
             return "¿Buscas filtro de arena o cartucho? ¿Para piscina o agua potable?"
 
-    if "dosificacion" in norm or "dosificación" in norm or "dosificador" in norm:
+    if match.has("dosificador"):
         return "¿Qué químico deseas dosificar y a qué caudal?"
 
-    if "accesor" in norm or "repuesto" in norm:
-        if "piscin" in norm:
+    if match.has("accesorio", "repuesto"):
+        if match.has("piscina"):
             return (
                 "Para piscina, ¿qué tipo de accesorio buscas "
                 "(iluminación, limpieza, seguridad o repuestos)?"
@@ -178,7 +153,7 @@ def route_playbook(phone: str, text: str, is_weekend: bool) -> Optional[Playbook
       - selección explícita 1-5 o palabra exacta de línea => brochure
       - TODO lo demás => None (para que caiga a búsqueda en Woo)
     """
-    norm = _normalize(text)
+    norm = normalize(text)
     if not norm:
         return PlaybookResult(reply=WELCOME_MESSAGE)
 
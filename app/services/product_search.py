@@ -1,67 +1,53 @@
+import asyncio
+import logging
 import re
-import unicodedata
 from typing import Optional, Tuple, List, Dict, Any, Sequence
 
+from app.core.settings import get_settings
 from app.domain.playbook import WELCOME_MESSAGE
+from app.domain.catalog_links import catalog_category_slug
 from app.domain.company_profile import BUSINESS_LINES, normalize_line_key
 from app.services.openai_product_query import build_product_search_plan
 from app.services.woocommerce import woocommerce_client
-from app.services.catalog_cache import search_catalog
+from app.services.catalog_cache import (
+    catalog_age_seconds,
+    catalog_numeric_values,
+    search_catalog,
+    semantic_search_catalog,
+)
+from app.services.numeric_attributes import (
+    NumericFilter,
+    matches_numeric,
+    parse_numeric_filters,
+    product_numeric_attributes,
+    strip_measures,
+)
+from app.services.query_synonyms import match_query
+from app.services.resilience import CircuitOpenError, remaining_budget
 from app.utils.formatting import format_cop
+from app.utils.text import STOPWORDS, analyze, fold
 
 try:
     from app.services.openai_rerank import rerank_products
 except Exception:  # pragma: no cover - optional dependency
     rerank_products = None
 
+logger = logging.getLogger(__name__)
 
-_STOPWORDS = {
-    "a",
-    "al",
-    "algo",
-    "alguien",
-    "as",
-    "con",
-    "como",
-    "cual",
-    "cuando",
-    "de",
-    "del",
-    "donde",
-    "el",
-    "ella",
-    "ellos",
-    "en",
-    "es",
-    "esta",
-    "estoy",
-    "fue",
-    "ha",
-    "hola",
-    "las",
-    "lo",
-    "los",
-    "la",
-    "me",
-    "mi",
-    "mis",
-    "necesito",
-    "quiero",
-    "que",
-    "para",
-    "por",
-    "ser",
-    "si",
-    "sin",
-    "su",
-    "sus",
-    "una",
-    "un",
-    "unos",
-    "unas",
-    "y",
-    "o",
-}
+settings = get_settings()
+_SEARCH_MODE = str(getattr(settings, "PRODUCT_SEARCH_MODE", "woo_first") or "woo_first").strip().lower()
+_LOCAL_MAX_AGE_SECONDS = float(getattr(settings, "PRODUCT_SEARCH_LOCAL_MAX_AGE_SECONDS", 3600.0))
+_LOCAL_MIN_HITS = max(1, int(getattr(settings, "PRODUCT_SEARCH_LOCAL_MIN_HITS", 3)))
+_WOO_CONCURRENCY = max(1, int(getattr(settings, "PRODUCT_SEARCH_WOO_CONCURRENCY", 4)))
+_WOO_MAX_QUERIES = 12
+_WOO_ENOUGH_HITS = 5               # candidatos filtrados con los que se deja de esperar a Woo
+_WOO_DEADLINE_RESERVE_SECONDS = 2.0  # presupuesto que se deja para catálogo local + rerank
+_SEMANTIC_CANDIDATES = 20          # vecinos del índice vectorial que se suman a los del BM25
+_RRF_K = 60                        # constante de reciprocal rank fusion (BM25 + vectores)
+
+# Qué camino respondió cada búsqueda y por qué local_first cayó a Woo (ver search_path_stats).
+_search_path_counts: Dict[str, int] = {"woo": 0, "local": 0, "none": 0}
+_woo_fallback_reasons: Dict[str, int] = {"cold": 0, "stale": 0, "few_hits": 0}
 
 _BROAD_TERMS = {
     "agua",
@@ -83,61 +69,12 @@ _BROAD_TERMS = {
 _SHORT_TERMS = {"uv", "ph"}
 
 
-def _normalize(text: str) -> str:
-    t = (text or "").strip().lower()
-    t = "".join(
-        ch for ch in unicodedata.normalize("NFD", t)
-        if unicodedata.category(ch) != "Mn"
-    )
-    t = re.sub(r"\s+", " ", t)
-    return t
-
-
 def _keyword_queries(text: str) -> List[str]:
-    norm = _normalize(text)
-    if not norm:
-        return []
-
-    keywords: List[str] = []
-    if "bomba" in norm or "bombeo" in norm:
-        keywords.append("bomba")
-    if "piscin" in norm:
-        keywords.append("piscina")
-    if "filtro" in norm or "filtracion" in norm:
-        keywords.append("filtro")
-    if "cartucho" in norm:
-        keywords.append("cartucho")
-    if "arena" in norm:
-        keywords.append("arena")
-    if "cloro" in norm:
-        keywords.append("cloro")
-    if "alguicida" in norm:
-        keywords.append("alguicida")
-    if "clarificador" in norm:
-        keywords.append("clarificador")
-    if "dosificador" in norm or "dosificacion" in norm:
-        keywords.append("dosificador")
-    if "osmosis" in norm:
-        keywords.append("osmosis")
-    if "uv" in norm or "ultravioleta" in norm:
-        keywords.append("ultravioleta")
-    if "fotometro" in norm:
-        keywords.append("fotometro")
-    if "turbid" in norm:
-        keywords.append("turbidimetro")
-
-    # dedup manteniendo orden
-    seen = set()
-    out: List[str] = []
-    for k in keywords:
-        if k not in seen:
-            seen.add(k)
-            out.append(k)
-    return out
+    return match_query(text).keywords()
 
 
 def _extract_specific_terms(text: str) -> List[str]:
-    norm = _normalize(text)
+    norm = fold(text)
     if not norm:
         return []
     tokens = re.findall(r"[a-z0-9]+", norm)
@@ -147,7 +84,7 @@ def _extract_specific_terms(text: str) -> List[str]:
             continue
         if len(t) < 4 and t not in _SHORT_TERMS:
             continue
-        if t in _STOPWORDS or t in _BROAD_TERMS:
+        if t in STOPWORDS or t in _BROAD_TERMS:
             continue
         terms.append(t)
     # dedup
@@ -161,55 +98,13 @@ def _extract_specific_terms(text: str) -> List[str]:
 
 
 def _required_groups_from_text(text: str) -> List[List[str]]:
-    norm = _normalize(text)
-    if not norm:
-        return []
-
-    groups: List[List[str]] = []
-
-    if "bomba" in norm or "bombeo" in norm or "motobomba" in norm:
-        groups.append(["bomba", "bombeo", "motobomba"])
-    if "filtro" in norm or "filtracion" in norm:
-        groups.append(["filtro", "filtracion"])
-    if "piscin" in norm:
-        groups.append(["piscina", "piscinas"])
-    if "cartucho" in norm:
-        groups.append(["cartucho", "cartuchos"])
-    if "arena" in norm:
-        groups.append(["arena"])
-    if "cloro" in norm:
-        groups.append(["cloro"])
-    if "alguicida" in norm:
-        groups.append(["alguicida"])
-    if "clarificador" in norm:
-        groups.append(["clarificador"])
-    if "dosificador" in norm or "dosificacion" in norm:
-        groups.append(["dosificador", "dosificacion", "dosificar"])
-    if "osmosis" in norm:
-        groups.append(["osmosis", "osmosis inversa"])
-    if "uv" in norm or "ultravioleta" in norm:
-        groups.append(["uv", "ultravioleta"])
-    if "fotometro" in norm:
-        groups.append(["fotometro"])
-    if "turbid" in norm:
-        groups.append(["turbidimetro", "turbidez"])
-
-    # Dedup por contenido
-    seen = set()
-    out: List[List[str]] = []
-    for g in groups:
-        key = tuple(g)
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append(g)
-    return out
+    return match_query(text).required_groups()
 
 
 def _matches_required_groups(text: str, groups: List[List[str]]) -> bool:
     if not groups:
         return True
-    norm = _normalize(text)
+    norm = fold(text)
     for group in groups:
         if not any(token in norm for token in group):
             return False
@@ -219,7 +114,7 @@ def _matches_required_groups(text: str, groups: List[List[str]]) -> bool:
 def _matches_specific_terms(text: str, terms: Sequence[str]) -> bool:
     if not terms:
         return True
-    norm = _normalize(text)
+    norm = fold(text)
     return any(t in norm for t in terms)
 
 
@@ -243,6 +138,16 @@ def _product_text(p: Dict[str, Any]) -> str:
     return f"{name} {cat_names} {short_desc}"
 
 
+def _numeric_values(p: Dict[str, Any]) -> Dict[str, List[float]]:
+    """
+    Medidas de un resultado de Woo: las del índice de rangos si el producto está
+    cacheado (incluyen sus atributos); si no, las que se leen de nombre y descripción.
+    """
+    pid = p.get("id")
+    cached = catalog_numeric_values(pid) if isinstance(pid, int) else None
+    return cached if cached is not None else product_numeric_attributes(p)
+
+
 def _truncate(text: str, limit: int = 80) -> str:
     if not text:
         return ""
@@ -367,15 +272,16 @@ def _line_label_from_hint(line_hint: Optional[str], text: str) -> Optional[str]:
 
 
 def _build_search_intro(text: str, line_hint: Optional[str]) -> Optional[str]:
-    norm = _normalize(text)
+    norm = fold(text)
     if not norm:
         return None
     line_label = _line_label_from_hint(line_hint, text)
-    if "accesor" in norm:
+    match = match_query(text)
+    if match.has("accesorio"):
         if line_label:
             return f"Con gusto. En Aqua manejamos estos accesorios para {line_label}:"
         return "Con gusto. En Aqua manejamos estos accesorios:"
-    if "informacion" in norm or "info" in norm:
+    if match.has("informacion"):
         if line_label:
             return f"Con gusto. En Aqua manejamos estas opciones para {line_label}:"
         return "Con gusto. En Aqua manejamos estas opciones:"
@@ -385,28 +291,294 @@ def _build_search_intro(text: str, line_hint: Optional[str]) -> Optional[str]:
 
 
 def _build_search_outro(text: str, line_hint: Optional[str]) -> Optional[str]:
-    norm = _normalize(text)
+    norm = fold(text)
     if not norm:
         return None
-    if "accesor" in norm or "repuesto" in norm:
+    match = match_query(text)
+    if match.has("accesorio", "repuesto"):
         return (
             "Si buscas un accesorio específico (iluminación, limpieza, seguridad o repuestos), "
             "dímelo y afino la búsqueda."
         )
-    if "quim" in norm:
+    if match.has("quimico"):
         return "Si buscas un químico específico (cloro, alguicida, clarificador), dímelo."
-    if "bomba" in norm or "bombeo" in norm:
+    if match.has("bomba"):
         return "Si tienes caudal, altura o HP, dímelos para afinar."
-    if line_hint and "piscin" in norm:
+    if line_hint and match.has("piscina"):
         return "Si prefieres otro tipo (bomba, filtro, calentador o químico), dímelo."
     return "Si buscas algo más específico, dímelo y ajusto la búsqueda en el catálogo."
 
 
+def _record_search_path(path: str, reason: Optional[str] = None) -> None:
+    _search_path_counts[path] = _search_path_counts.get(path, 0) + 1
+    if reason:
+        _woo_fallback_reasons[reason] = _woo_fallback_reasons.get(reason, 0) + 1
+
+
+def search_path_stats() -> Dict[str, Any]:
+    """
+    Qué camino respondió cada búsqueda: "woo" (?search= en vivo), "local"
+    (catálogo en memoria) o "none" (sin resultados), y por qué local_first tuvo
+    que caer a Woo (catálogo frío, vencido o con pocos resultados).
+    """
+    return {
+        "mode": _SEARCH_MODE,
+        "local_max_age_seconds": _LOCAL_MAX_AGE_SECONDS,
+        "local_min_hits": _LOCAL_MIN_HITS,
+        "served_by": dict(_search_path_counts),
+        "woo_fallback_reasons": dict(_woo_fallback_reasons),
+    }
+
+
+def _local_skip_reason() -> Optional[str]:
+    """
+    Motivo para no usar el catálogo local como motor principal (None si está listo).
+    """
+    age = catalog_age_seconds()
+    if age is None:
+        return "cold"
+    if age > _LOCAL_MAX_AGE_SECONDS:
+        return "stale"
+    return None
+
+
+def _query_key(query: str, line_stems: frozenset) -> Tuple[str, ...]:
+    """
+    Clave para descartar queries casi duplicadas: raíces sin las de la línea
+    ("filtros piscinas" con línea piscinas == "filtro" == "filtración").
+    """
+    stems = frozenset(analyze(query, 2)) - line_stems
+    return tuple(sorted(stems)) if stems else (fold(query),)
+
+
+def _dedup_queries(queries: Sequence[str], line_hint: Optional[str]) -> List[str]:
+    line_stems = frozenset(analyze(line_hint, 2)) if line_hint else frozenset()
+    seen = set()
+    out: List[str] = []
+    for q in queries:
+        if not q.strip():
+            continue
+        key = _query_key(q, line_stems)
+        if key not in seen:
+            seen.add(key)
+            out.append(q)
+    return out
+
+
+def _woo_wait_timeout() -> Optional[float]:
+    """
+    Cuánto esperar más resultados de Woo: lo que queda del presupuesto del turno
+    menos la reserva para el catálogo local y el rerank (None = sin límite).
+    """
+    budget = remaining_budget()
+    if budget is None:
+        return None
+    return max(0.0, budget - _WOO_DEADLINE_RESERVE_SECONDS)
+
+
+async def _woo_candidates(
+    raw: str,
+    queries: List[str],
+    *,
+    line_hint: Optional[str],
+    required_groups: List[List[str]],
+    specific_terms: List[str],
+    numeric_filters: Sequence[NumericFilter],
+) -> List[Dict[str, Any]]:
+    """
+    Búsqueda en vivo con ?search= de Woo (hasta 12 queries), filtrada en memoria.
+
+    Las queries se lanzan en paralelo (a lo sumo _WOO_CONCURRENCY a la vez) y sus
+    resultados se mezclan en orden de prioridad a medida que llegan: la query i
+    solo se mezcla cuando terminaron las anteriores. Con suficientes candidatos,
+    con el presupuesto del turno por agotarse o con Woo caído se cancelan las
+    que siguen en vuelo.
+    """
+    search_queue: List[str] = []
+    for q in queries:
+        search_queue.append(q)
+        if line_hint:
+            search_queue.append(f"{q} {line_hint}".strip())
+
+    # expansiones mínimas (woo_queries de app/domain/query_synonyms.json)
+    search_queue += match_query(raw).woo_queries()
+
+    uniq = _dedup_queries(search_queue, line_hint)[:_WOO_MAX_QUERIES]
+    if not uniq:
+        return []
+
+    sem = asyncio.Semaphore(_WOO_CONCURRENCY)
+
+    async def _search(q: str) -> List[Dict[str, Any]]:
+        async with sem:
+            return await woocommerce_client.search_products(q, per_page=15)
+
+    tasks = [asyncio.ensure_future(_search(q)) for q in uniq]
+    position = {task: idx for idx, task in enumerate(tasks)}
+    finished: Dict[int, List[Dict[str, Any]]] = {}
+    seen_ids = set()
+    merged_raw: List[Dict[str, Any]] = []
+    cursor = 0
+
+    def _merge_ready() -> None:
+        nonlocal cursor
+        while cursor in finished and len(merged_raw) < _WOO_ENOUGH_HITS:
+            for p in finished.pop(cursor):
+                text = _product_text(p)
+                if not _matches_required_groups(text, required_groups):
+                    continue
+                if not _matches_specific_terms(text, specific_terms):
+                    continue
+                if numeric_filters and not matches_numeric(_numeric_values(p), numeric_filters):
+                    continue
+                pid = p.get("id")
+                if pid in seen_ids:
+                    continue
+                seen_ids.add(pid)
+                merged_raw.append(p)
+            cursor += 1
+
+    pending = set(tasks)
+    try:
+        while pending and len(merged_raw) < _WOO_ENOUGH_HITS:
+            timeout = _woo_wait_timeout()
+            if timeout is not None and timeout <= 0:
+                logger.warning("Búsqueda Woo cortada por presupuesto", extra={"pending": len(pending)})
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning("Búsqueda Woo cortada por presupuesto", extra={"pending": len(pending)})
+                break
+            woo_down = False
+            for task in done:
+                idx = position[task]
+                try:
+                    finished[idx] = task.result()
+                except (CircuitOpenError, TimeoutError):
+                    # Woo caído o sin presupuesto: no esperamos al resto.
+                    logger.warning("Búsqueda Woo interrumpida", extra={"query": uniq[idx]}, exc_info=True)
+                    woo_down = True
+                    finished[idx] = []
+                except Exception:
+                    # Ya se reintentó (429/5xx) en la capa de resiliencia; descartamos esta query.
+                    logger.warning("Query Woo descartada", extra={"query": uniq[idx]}, exc_info=True)
+                    finished[idx] = []
+            _merge_ready()
+            if woo_down:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    # Corte anticipado: lo que llegó fuera de orden también sirve (en orden de prioridad).
+    for idx in sorted(finished):
+        cursor = idx
+        _merge_ready()
+    return merged_raw
+
+
+async def _local_candidates(
+    raw: str,
+    *,
+    line_hint: Optional[str],
+    required_groups: List[List[str]],
+    specific_terms: List[str],
+    numeric_filters: Sequence[NumericFilter],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Catálogo local: (relevantes, resto).
+
+    Relevantes = ranking BM25 filtrado igual que los resultados de Woo, fusionado
+    con los vecinos del índice vectorial. Resto = candidatos BM25 que no pasaron
+    los filtros (solo coinciden términos genéricos): se usan únicamente si Woo
+    tampoco encontró nada.
+    """
+    try:
+        # Primero dentro del subárbol de categorías de la línea; si no hay nada, en todo el catálogo.
+        category = catalog_category_slug(line_hint)
+        candidates = []
+        if category:
+            candidates = await search_catalog(
+                raw, line_hint=line_hint, limit=50, category=category, numeric=numeric_filters
+            )
+        if not candidates:
+            candidates = await search_catalog(raw, line_hint=line_hint, limit=50, numeric=numeric_filters)
+    except Exception:
+        candidates = []
+
+    filtered = [
+        p
+        for p in candidates
+        if _matches_required_groups(_product_text(p), required_groups)
+        and _matches_specific_terms(_product_text(p), specific_terms)
+    ]
+
+    # Vecinos del índice vectorial: cubren paráfrasis sin términos en común con el producto
+    # ("que no se ponga verde" -> alguicida). No se les exigen los términos específicos.
+    try:
+        neighbours = await semantic_search_catalog(raw, limit=_SEMANTIC_CANDIDATES)
+    except Exception:
+        neighbours = []
+    semantic = [
+        p
+        for p in neighbours
+        if _matches_required_groups(_product_text(p), required_groups)
+        and (not numeric_filters or matches_numeric(_numeric_values(p), numeric_filters))
+    ]
+    relevant = _fuse_rankings(filtered, semantic) if filtered and semantic else (filtered or semantic)
+    seen = {p.get("id") for p in relevant}
+    return relevant, [p for p in candidates if p.get("id") not in seen]
+
+
+def _fuse_rankings(*rankings: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion: suma 1 / (k + posición) de cada lista, así un producto
+    que aparece arriba en ambas (BM25 y vectores) queda primero.
+    """
+    scores: Dict[Any, float] = {}
+    products: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for pos, p in enumerate(ranking):
+            pid = p.get("id")
+            scores[pid] = scores.get(pid, 0.0) + 1.0 / (_RRF_K + pos + 1)
+            products.setdefault(pid, p)
+    return [products[pid] for pid in sorted(scores, key=scores.get, reverse=True)]
+
+
+async def _reply_with_candidates(
+    raw: str,
+    candidates: List[Dict[str, Any]],
+    *,
+    intro: Optional[str],
+    outro: Optional[str],
+) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    selected_raw, question = await _maybe_rerank(raw, candidates, top_k=3)
+    if question:
+        return question, [], []
+    pool = [_summarize_product(p) for p in candidates[:12]]
+    if selected_raw:
+        selected = [_summarize_product(p) for p in selected_raw]
+    else:
+        selected = pool[:3]
+    return _format_products_reply(selected, intro=intro, outro=outro), selected, pool
+
+
 async def smart_product_search(
     original_text: str,
     *,
     line_hint: Optional[str] = None,
 ) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Búsqueda de productos para el bot.
+
+    - woo_first (default): ?search= de Woo en vivo; el catálogo local es el respaldo.
+    - local_first: el catálogo en memoria es el motor principal y se consulta antes
+      que el plan de OpenAI; el plan (y su pregunta de aclaración) y Woo solo se usan
+      si el catálogo está frío, vencido (PRODUCT_SEARCH_LOCAL_MAX_AGE_SECONDS) o
+      devuelve menos de PRODUCT_SEARCH_LOCAL_MIN_HITS resultados.
+
+    `search_path_stats()` cuenta qué camino respondió.
+    """
     raw = (original_text or "").strip()
     if not raw:
         return WELCOME_MESSAGE, [], []
@@ -414,6 +586,27 @@ async def smart_product_search(
     intro = _build_search_intro(raw, line_hint)
     outro = _build_search_outro(raw, line_hint)
 
+    filters = {
+        "line_hint": line_hint,
+        "required_groups": _required_groups_from_text(raw),
+        "specific_terms": _extract_specific_terms(strip_measures(raw)),
+        "numeric_filters": parse_numeric_filters(raw),
+    }
+
+    local: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
+    fallback_reason: Optional[str] = None
+    if _SEARCH_MODE == "local_first":
+        # 1a) catálogo local como motor principal, sin esperar a OpenAI
+        # (solo cuentan los resultados que pasan los filtros)
+        fallback_reason = _local_skip_reason()
+        if fallback_reason is None:
+            local = await _local_candidates(raw, **filters)
+            relevant, _ = local
+            if len(relevant) >= _LOCAL_MIN_HITS:
+                _record_search_path("local")
+                return await _reply_with_candidates(raw, relevant, intro=intro, outro=outro)
+            fallback_reason = "few_hits"
+
     # 1) queries desde OpenAI (si falla, seguimos igual)
     plan_used = False
     try:
@@ -428,97 +621,25 @@ async def smart_product_search(
         queries = [raw]
 
     keywords = _keyword_queries(raw)
-    required_groups = _required_groups_from_text(raw)
-    specific_terms = _extract_specific_terms(raw)
     if keywords:
         if plan_used:
             queries = keywords + queries
         else:
             queries = keywords
 
-    # 2) intento 1: Woo search normal (rápido)
-    seen_ids = set()
-    merged: List[Dict[str, Any]] = []
-    merged_raw: List[Dict[str, Any]] = []
-
-    search_queue: List[str] = []
-    for q in queries:
-        search_queue.append(q)
-        if line_hint:
-            search_queue.append(f"{q} {line_hint}".strip())
-
-    # expansiones mínimas (para tus 2 ejemplos reales)
-    n = raw.lower()
-    if "filtr" in n:
-        search_queue += ["filtro", "filtros", "filtracion", "filtración"]
-    if "quim" in n:
-        search_queue += ["cloro", "ph", "alguicida", "clarificador", "acidet"]
-
-    # dedup
-    uniq: List[str] = []
-    seenq = set()
-    for q in search_queue:
-        k = q.strip().lower()
-        if k and k not in seenq:
-            seenq.add(k)
-            uniq.append(q)
-
-    for q in uniq[:12]:
-        try:
-            items = await woocommerce_client.search_products(q, per_page=15)
-        except Exception:
-            continue
-        for p in items:
-            text = _product_text(p)
-            if not _matches_required_groups(text, required_groups):
-                continue
-            if not _matches_specific_terms(text, specific_terms):
-                continue
-            pid = p.get("id")
-            if pid in seen_ids:
-                continue
-            seen_ids.add(pid)
-            merged.append(_summarize_product(p))
-            merged_raw.append(p)
-        if len(merged) >= 5:
-            break
-
-    if merged_raw:
-        selected_raw, question = await _maybe_rerank(raw, merged_raw, top_k=3)
-        if question:
-            return question, [], []
-        if selected_raw:
-            selected = [_summarize_product(p) for p in selected_raw]
-            pool = [_summarize_product(p) for p in merged_raw[:12]]
-            return _format_products_reply(selected, intro=intro, outro=outro), selected, pool
-        pool = [_summarize_product(p) for p in merged_raw[:12]]
-        selected = pool[:3]
-        return _format_products_reply(selected, intro=intro, outro=outro), selected, pool
+    # 2) Woo search en vivo (principal en woo_first, respaldo en local_first)
+    woo = await _woo_candidates(raw, queries, **filters)
+    if woo:
+        _record_search_path("woo", fallback_reason)
+        return await _reply_with_candidates(raw, woo, intro=intro, outro=outro)
 
     # 3) intento 2 (el que te quita el “zombie”): catálogo local + ranking
-    try:
-        candidates = await search_catalog(raw, line_hint=line_hint, limit=50)
-    except Exception:
-        candidates = []
-
-    if candidates:
-        filtered = [
-            p
-            for p in candidates
-            if _matches_required_groups(_product_text(p), required_groups)
-            and _matches_specific_terms(_product_text(p), specific_terms)
-        ]
-        if not filtered:
-            filtered = candidates
-        selected_raw, question = await _maybe_rerank(raw, filtered, top_k=3)
-        if question:
-            return question, [], []
-        if selected_raw:
-            selected = [_summarize_product(p) for p in selected_raw]
-            pool = [_summarize_product(p) for p in filtered[:12]]
-            return _format_products_reply(selected, intro=intro, outro=outro), selected, pool
-        pool = [_summarize_product(p) for p in filtered[:12]]
-        selected = pool[:3]
-        return _format_products_reply(selected, intro=intro, outro=outro), selected, pool
-
+    if local is None:
+        local = await _local_candidates(raw, **filters)
+    relevant, rest = local
+    if relevant or rest:
+        _record_search_path("local")
+        return await _reply_with_candidates(raw, relevant + rest, intro=intro, outro=outro)
+
+    _record_search_path("none")
     return _no_results_reply(), [], []
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.text import normalize
+
+_SYNONYMS_PATH = Path(__file__).resolve().parents[1] / "domain" / "query_synonyms.json"
+_INFIX_MIN_LEN = 5  # patrones desde este largo también valen dentro de palabras compuestas
+
+
+@dataclass(frozen=True)
+class SynonymGroup:
+    """
+    Grupo de sinónimos de app/domain/query_synonyms.json.
+
+    - patterns: raíces que activan el grupo ("piscin" -> piscina/piscinas; ver SynonymMatcher).
+    - words: palabras completas que lo activan (siglas cortas como "uv").
+    - keyword: query corta que se agrega a la búsqueda en Woo.
+    - required: alguno de estos términos debe estar en el producto.
+    - line: línea de negocio que sugiere (el orden del archivo define la prioridad).
+    - expand / expand_line: tokens extra para el índice local (solo en esa línea, si se indica).
+    - woo_queries: queries extra para /products?search=.
+    - describe: paráfrasis de cómo lo piden los clientes ("agua verde" -> alguicida),
+      que se agregan al vector de los productos del grupo (ver catalog_vectors).
+    """
+
+    id: str
+    patterns: Tuple[str, ...]
+    words: Tuple[str, ...] = ()
+    keyword: Optional[str] = None
+    required: Tuple[str, ...] = ()
+    line: Optional[str] = None
+    expand: Tuple[str, ...] = ()
+    expand_line: Optional[str] = None
+    woo_queries: Tuple[str, ...] = ()
+    describe: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "SynonymGroup":
+        return cls(
+            id=str(d["id"]),
+            patterns=tuple(normalize(p) for p in d.get("patterns") or [] if normalize(p)),
+            words=tuple(normalize(w) for w in d.get("words") or [] if normalize(w)),
+            keyword=d.get("keyword") or None,
+            required=tuple(d.get("required") or ()),
+            line=d.get("line") or None,
+            expand=tuple(d.get("expand") or ()),
+            expand_line=d.get("expand_line") or None,
+            woo_queries=tuple(d.get("woo_queries") or ()),
+            describe=tuple(d.get("describe") or ()),
+        )
+
+
+@dataclass(frozen=True)
+class QueryMatch:
+    """
+    Grupos presentes en un mensaje (en el orden del archivo de sinónimos).
+    """
+
+    groups: Tuple[SynonymGroup, ...] = ()
+    ids: frozenset = field(default_factory=frozenset)
+
+    def has(self, *group_ids: str) -> bool:
+        return any(g in self.ids for g in group_ids)
+
+    @property
+    def line(self) -> Optional[str]:
+        for g in self.groups:
+            if g.line:
+                return g.line
+        return None
+
+    def keywords(self) -> List[str]:
+        out: List[str] = []
+        for g in self.groups:
+            if g.keyword and g.keyword not in out:
+                out.append(g.keyword)
+        return out
+
+    def required_groups(self) -> List[List[str]]:
+        return [list(g.required) for g in self.groups if g.required]
+
+    def expansions(self, line_hint: Optional[str]) -> List[str]:
+        lines = {line_hint, self.line}
+        out: List[str] = []
+        for g in self.groups:
+            if g.expand and (g.expand_line is None or g.expand_line in lines):
+                out.extend(g.expand)
+        return out
+
+    def woo_queries(self) -> List[str]:
+        out: List[str] = []
+        for g in self.groups:
+            out.extend(g.woo_queries)
+        return out
+
+    def descriptions(self) -> List[str]:
+        out: List[str] = []
+        for g in self.groups:
+            out.extend(g.describe)
+        return out
+
+
+class SynonymMatcher:
+    """
+    Compila todos los patrones en un solo autómata Aho-Corasick: cada mensaje se
+    recorre una vez y el resultado (cacheado por texto) lo reutilizan todas las
+    etapas (routers, queries a Woo, expansión del índice local).
+
+    Los patrones de 5+ letras cuentan en cualquier parte de una palabra, para
+    cubrir compuestos ("electrobomba", "microfiltración"); los más cortos solo
+    al inicio de una palabra (el texto y el patrón se prefijan con un espacio,
+    así "quim" no se activa dentro de otra palabra). Las `words` llevan espacio a
+    ambos lados: "uv" no se activa con "uva".
+    """
+
+    def __init__(self, groups: List[SynonymGroup]) -> None:
+        self.groups = tuple(groups)
+        owners: List[int] = []
+        patterns: List[str] = []
+        for gi, g in enumerate(self.groups):
+            for p in g.patterns:
+                patterns.append(p if len(p) >= _INFIX_MIN_LEN else " " + p)
+                owners.append(gi)
+            for w in g.words:
+                patterns.append(f" {w} ")
+                owners.append(gi)
+        self._owners = tuple(owners)
+        self._automaton = AhoCorasick(patterns)
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def _match(self, text: Optional[str]) -> QueryMatch:
+        norm = normalize(text)
+        if not norm:
+            return QueryMatch()
+        found = {self._owners[idx] for idx in self._automaton.find_all(f" {norm} ")}
+        groups = tuple(self.groups[gi] for gi in sorted(found))
+        return QueryMatch(groups=groups, ids=frozenset(g.id for g in groups))
+
+    def match_document(self, text: Optional[str]) -> QueryMatch:
+        """
+        Igual que `match` pero sin cachear el texto (para nombres de productos al indexar).
+        """
+        return self._match(text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "groups": len(self.groups),
+            "patterns": len(self._automaton),
+            "cache": self.match.cache_info()._asdict(),
+        }
+
+
+def _load_groups(path: Path) -> List[SynonymGroup]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return [SynonymGroup.from_dict(g) for g in data.get("groups") or []]
+
+
+synonym_matcher = SynonymMatcher(_load_groups(_SYNONYMS_PATH))
+
+
+def match_query(text: Optional[str]) -> QueryMatch:
+    return synonym_matcher.match(text)
@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+import httpx
+
+from app.core.settings import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+T = TypeVar("T")
+
+_MIN_SAMPLES = 20  # muestras de latencia antes de dejar el timeout por defecto
+_MIN_ATTEMPT_SECONDS = 0.5  # no vale la pena reintentar con menos presupuesto que esto
+
+# Instante (time.monotonic) en que vence el presupuesto de tiempo del llamador actual.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    El circuito del upstream está abierto: se falla rápido sin llamar a la red.
+    """
+
+    def __init__(self, upstream: str, retry_in: float) -> None:
+        super().__init__(f"Circuito abierto para {upstream} (reintento en {retry_in:.1f}s)")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+def _is_failure(exc: BaseException) -> bool:
+    """
+    Cuenta para el breaker: errores de red/timeouts y respuestas 5xx/429.
+    Los 4xx son errores del llamador (SKU inexistente, payload inválido), no del upstream.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code if exc.response is not None else 0
+        return status >= 500 or status == 429
+    return isinstance(exc, (httpx.TransportError, TimeoutError))
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Lee el header Retry-After (segundos o fecha HTTP) de una respuesta 429/503.
+    """
+    if not isinstance(exc, httpx.HTTPStatusError) or exc.response is None:
+        return None
+    raw = (exc.response.headers.get("Retry-After") or "").strip()
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+@contextmanager
+def deadline_after(seconds: float) -> Iterator[None]:
+    """
+    Fija el presupuesto de tiempo del flujo actual: timeouts y reintentos de
+    todas las llamadas a upstreams dentro del bloque se recortan para no pasarse.
+
+    Si ya hay un presupuesto más corto vigente, se respeta ese.
+    """
+    target = time.monotonic() + max(0.0, float(seconds))
+    current = _deadline.get()
+    token = _deadline.set(target if current is None else min(current, target))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def without_deadline() -> Iterator[None]:
+    """
+    Quita el presupuesto heredado: para tareas en segundo plano lanzadas dentro de
+    un turno (asyncio.create_task copia el contexto), que no deben cortarse con él.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """
+    Segundos que le quedan al presupuesto del llamador (None = sin límite).
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class UpstreamGuard:
+    """
+    Circuit breaker + timeout adaptativo para un upstream (WooCommerce, OpenAI, ...).
+
+    - closed: las llamadas pasan; N fallas o latencias excesivas seguidas lo abren.
+    - open: falla rápido con CircuitOpenError durante `open_seconds`.
+    - half_open: deja pasar una sola llamada de prueba; si sale bien se cierra.
+
+    El timeout se deriva del percentil observado de latencias exitosas
+    (p. ej. p95 * 2), acotado entre `min_timeout` y `max_timeout`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_timeout: float,
+        min_timeout: float,
+        slow_call_seconds: float,
+        failure_threshold: int,
+        open_seconds: float,
+        percentile: float,
+        multiplier: float,
+        max_attempts: int = 1,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+        window: int = 200,
+    ) -> None:
+        self.name = name
+        self.max_timeout = float(max_timeout)
+        self.min_timeout = min(float(min_timeout), self.max_timeout)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = float(open_seconds)
+        self.percentile = min(max(float(percentile), 0.5), 1.0)
+        self.multiplier = max(1.0, float(multiplier))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_delay = max(0.0, float(retry_base_delay))
+        self.retry_max_delay = max(self.retry_base_delay, float(retry_max_delay))
+
+        self.state = "closed"
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.opened = 0
+        self.retries = 0
+        self.retry_after_waits = 0
+        self.retries_exhausted = 0
+        self.budget_exhausted = 0
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[idx]
+
+    def timeout(self) -> float:
+        if len(self._latencies) < _MIN_SAMPLES:
+            return self.max_timeout
+        observed = self.latency_percentile(self.percentile) or self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, observed * self.multiplier))
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """
+        Espera antes del reintento `attempt` (1 = primer reintento).
+
+        Con Retry-After se respeta lo que pide el servidor; si no, backoff
+        exponencial acotado con jitter completo para no sincronizar reintentos.
+        """
+        if retry_after is not None:
+            return retry_after
+        cap = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0.0, cap)
+
+    def before_call(self) -> None:
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            retry_in = self._opened_at + self.open_seconds - time.monotonic()
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, retry_in)
+            self.state = "half_open"
+        # half_open: una sola llamada de prueba a la vez
+        if self._probe_in_flight:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, 0.0)
+        self._probe_in_flight = True
+
+    def record_success(self, latency: float) -> None:
+        self.calls += 1
+        self._probe_in_flight = False
+        if latency > self.slow_call_seconds:
+            self.slow_calls += 1
+            self._register_bad_call()
+            return
+        self._latencies.append(latency)
+        self._consecutive_failures = 0
+        if self.state != "closed":
+            logger.info("Circuito cerrado", extra={"upstream": self.name})
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self.calls += 1
+        self.failures += 1
+        self._probe_in_flight = False
+        self._register_bad_call()
+
+    def record_neutral(self, latency: float) -> None:
+        """
+        Llamada que terminó con un error del llamador (4xx): el upstream respondió.
+        """
+        self.calls += 1
+        self._probe_in_flight = False
+        self._latencies.append(latency)
+        self._consecutive_failures = 0
+        self.state = "closed"
+
+    def record_abandoned(self) -> None:
+        """
+        La llamada se canceló o falló localmente: no dice nada del upstream.
+        """
+        self._probe_in_flight = False
+
+    def _register_bad_call(self) -> None:
+        self._consecutive_failures += 1
+        if self.state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning(
+                    "Circuito abierto",
+                    extra={"upstream": self.name, "consecutive_failures": self._consecutive_failures},
+                )
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.latency_percentile(0.5)
+        p95 = self.latency_percentile(0.95)
+        return {
+            "state": self.state,
+            "timeout_seconds": round(self.timeout(), 3),
+            "latency_p50_seconds": round(p50, 3) if p50 is not None else None,
+            "latency_p95_seconds": round(p95, 3) if p95 is not None else None,
+            "samples": len(self._latencies),
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "consecutive_failures": self._consecutive_failures,
+            "max_attempts": self.max_attempts,
+            "retries": self.retries,
+            "retry_after_waits": self.retry_after_waits,
+            "retries_exhausted": self.retries_exhausted,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+
+def _build_guard(
+    name: str,
+    *,
+    max_timeout: float,
+    slow_call_seconds: float,
+    retry: bool = False,
+) -> UpstreamGuard:
+    return UpstreamGuard(
+        name,
+        max_timeout=max_timeout,
+        min_timeout=float(getattr(settings, "UPSTREAM_MIN_TIMEOUT_SECONDS", 2.0)),
+        slow_call_seconds=slow_call_seconds,
+        failure_threshold=int(getattr(settings, "UPSTREAM_BREAKER_FAILURE_THRESHOLD", 5)),
+        open_seconds=float(getattr(settings, "UPSTREAM_BREAKER_OPEN_SECONDS", 30.0)),
+        percentile=float(getattr(settings, "UPSTREAM_TIMEOUT_PERCENTILE", 0.95)),
+        multiplier=float(getattr(settings, "UPSTREAM_TIMEOUT_MULTIPLIER", 2.0)),
+        max_attempts=int(getattr(settings, "UPSTREAM_RETRY_MAX_ATTEMPTS", 3)) if retry else 1,
+        retry_base_delay=float(getattr(settings, "UPSTREAM_RETRY_BASE_DELAY_SECONDS", 0.5)),
+        retry_max_delay=float(getattr(settings, "UPSTREAM_RETRY_MAX_DELAY_SECONDS", 8.0)),
+    )
+
+
+# Techos de timeout = los valores fijos que antes vivían en cada servicio.
+# Solo se reintenta donde repetir es inocuo (lecturas Woo, Responses API);
+# los envíos de mensajes/CRM no se reintentan para no duplicarlos.
+_UPSTREAMS: Dict[str, UpstreamGuard] = {
+    "woocommerce": _build_guard(
+        "woocommerce",
+        max_timeout=float(getattr(settings, "WOOCOMMERCE_TIMEOUT_SECONDS", 10.0)),
+        slow_call_seconds=5.0,
+        retry=True,
+    ),
+    # Crawls del catálogo (páginas de 100 productos): latencias propias, techo más alto y
+    # sin conteo de llamadas lentas, para no achicar el timeout ni abrir el breaker del chat.
+    "woocommerce_bulk": _build_guard(
+        "woocommerce_bulk",
+        max_timeout=float(getattr(settings, "WOOCOMMERCE_CRAWL_TIMEOUT_SECONDS", 60.0)),
+        slow_call_seconds=math.inf,
+        retry=True,
+    ),
+    "openai": _build_guard("openai", max_timeout=20.0, slow_call_seconds=12.0, retry=True),
+    "clientify": _build_guard("clientify", max_timeout=15.0, slow_call_seconds=8.0),
+    "meta": _build_guard("meta", max_timeout=10.0, slow_call_seconds=5.0),
+    "twilio": _build_guard("twilio", max_timeout=15.0, slow_call_seconds=8.0),
+}
+
+
+def get_upstream(name: str) -> UpstreamGuard:
+    return _UPSTREAMS[name]
+
+
+def upstream_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: guard.stats() for name, guard in _UPSTREAMS.items()}
+
+
+async def _attempt(guard: UpstreamGuard, fn: Callable[[float], Awaitable[T]], budget: Optional[float]) -> T:
+    guard.before_call()
+    timeout = guard.timeout()
+    budget_limited = budget is not None and budget < timeout
+    if budget_limited:
+        timeout = budget
+    started = time.perf_counter()
+    try:
+        result = await fn(timeout)
+    except BaseException as exc:
+        if budget_limited and isinstance(exc, (httpx.TimeoutException, TimeoutError)):
+            # Se cortó por el presupuesto del llamador, no por lentitud del upstream.
+            guard.record_abandoned()
+        elif _is_failure(exc):
+            guard.record_failure()
+        elif isinstance(exc, httpx.HTTPStatusError):
+            guard.record_neutral(time.perf_counter() - started)
+        else:
+            guard.record_abandoned()
+        raise
+    guard.record_success(time.perf_counter() - started)
+    return result
+
+
+async def call_upstream(name: str, fn: Callable[[float], Awaitable[T]]) -> T:
+    """
+    Ejecuta `fn(timeout)` protegido por el breaker del upstream `name`.
+
+    `fn` recibe el timeout vigente (adaptativo, recortado al presupuesto del
+    llamador) y debe lanzar (p. ej. raise_for_status) para que las respuestas
+    5xx/429 cuenten como falla. Esas fallas se reintentan con backoff + jitter
+    (o lo que pida Retry-After) si el upstream lo permite y queda presupuesto.
+    """
+    guard = _UPSTREAMS[name]
+    attempt = 1
+    while True:
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            guard.budget_exhausted += 1
+            raise TimeoutError(f"Sin presupuesto de tiempo para llamar a {name}")
+        try:
+            return await _attempt(guard, fn, budget)
+        except CircuitOpenError:
+            raise
+        except Exception as exc:
+            if not _is_failure(exc) or guard.max_attempts <= 1:
+                raise
+            if attempt >= guard.max_attempts:
+                guard.retries_exhausted += 1
+                raise
+            retry_after = _retry_after_seconds(exc)
+            if retry_after is not None and retry_after > guard.retry_max_delay:
+                # El servidor pide esperar más de lo razonable para un mensaje en vivo.
+                guard.retries_exhausted += 1
+                raise
+            delay = guard.retry_delay(attempt, retry_after)
+            budget = remaining_budget()
+            if budget is not None and budget - delay < _MIN_ATTEMPT_SECONDS:
+                guard.budget_exhausted += 1
+                raise
+            guard.retries += 1
+            if retry_after is not None:
+                guard.retry_after_waits += 1
+            logger.warning(
+                "Reintentando llamada a upstream",
+                extra={"upstream": name, "attempt": attempt + 1, "delay": round(delay, 3), "error": repr(exc)},
+            )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def post_json(upstream: str, url: str, *, headers: Dict[str, str], payload: Any) -> httpx.Response:
+    """
+    POST JSON protegido por el breaker de `upstream`. Lanza HTTPStatusError en 4xx/5xx.
+    """
+
+    async def _post(timeout: float) -> httpx.Response:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.post(url, headers=headers, json=payload)
+            r.raise_for_status()
+            return r
+
+    return await call_upstream(upstream, _post)
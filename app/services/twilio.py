@@ -2,6 +2,7 @@ import logging
 import httpx
 
 from app.core.settings import get_settings
+from app.services.resilience import call_upstream
 
 logger = logging.getLogger(__name__)
 
@@ -38,14 +39,24 @@ async def send_twilio_whatsapp_message(*, to_whatsapp: str, body: str) -> None:
         "Body": body,
     }
 
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post(
-            url,
-            data=data,
-            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
-        )
-        if r.status_code >= 400:
-            logger.error(
-                "Twilio send failed",
-                extra={"status": r.status_code, "body": r.text},
+    async def _post(timeout: float) -> httpx.Response:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.post(
+                url,
+                data=data,
+                auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
             )
+        # 5xx/429 cuentan para el breaker; el resto de errores solo se loguea
+        if r.status_code >= 500 or r.status_code == 429:
+            r.raise_for_status()
+        return r
+
+    try:
+        r = await call_upstream("twilio", _post)
+    except httpx.HTTPStatusError as exc:
+        r = exc.response
+    if r.status_code >= 400:
+        logger.error(
+            "Twilio send failed",
+            extra={"status": r.status_code, "body": r.text},
+        )
@@ -4,6 +4,7 @@ from typing import Any, Dict
 import httpx
 
 from app.core.settings import get_settings
+from app.services.resilience import call_upstream
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -16,7 +17,8 @@ async def send_message(phone: str, text: str) -> None:
     - phone: número en formato internacional SIN el '+' (ej: 573001234567).
     - text: cuerpo del mensaje.
 
-    Lanza httpx.HTTPStatusError si la API responde con error 4xx/5xx.
+    Lanza httpx.HTTPStatusError si la API responde con error 4xx/5xx
+    y CircuitOpenError si el breaker de Meta está abierto.
     """
     # Endpoint: /{phone-number-id}/messages
     # Ej: https://graph.facebook.com/v19.0/123456789012345/messages
@@ -44,18 +46,21 @@ async def send_message(phone: str, text: str) -> None:
         extra={"to": phone, "body": text},
     )
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.post(url, json=payload, headers=headers)
-
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError:
-            logger.error(
-                "Error al enviar mensaje WhatsApp",
-                extra={
-                    "status_code": response.status_code,
-                    "response_text": response.text,
-                },
-            )
-            # Dejamos que el caller decida cómo manejar el error
-            raise
+    async def _post(timeout: float) -> httpx.Response:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response
+
+    try:
+        await call_upstream("meta", _post)
+    except httpx.HTTPStatusError as exc:
+        logger.error(
+            "Error al enviar mensaje WhatsApp",
+            extra={
+                "status_code": exc.response.status_code,
+                "response_text": exc.response.text,
+            },
+        )
+        # Dejamos que el caller decida cómo manejar el error
+        raise
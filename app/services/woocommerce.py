@@ -1,13 +1,128 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 import httpx
 
 from app.core.settings import get_settings
+from app.services.category_tree import category_tree
+from app.services.resilience import call_upstream, remaining_budget, without_deadline
+from app.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Breaker de los crawls del catálogo (páginas completas): ver resilience._UPSTREAMS.
+_BULK_UPSTREAM = "woocommerce_bulk"
+
+# Proyección (`_fields=`) por ruta de código: Woo solo serializa lo que realmente usamos.
+# Si una ruta empieza a leer un campo nuevo del producto, agrégalo aquí.
+_SUMMARY_FIELDS: Tuple[str, ...] = (
+    # product_search._summarize_product / selección 1-2-3 en conversation
+    "id",
+    "name",
+    "sku",
+    "price",
+    "regular_price",
+    "stock_status",
+    "stock_quantity",
+    "permalink",
+)
+
+PRODUCT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    # smart_product_search: _summarize_product + _product_text (filtros) + rerank_products
+    "search": _SUMMARY_FIELDS + ("short_description", "categories"),
+    # catalog_cache: lo de "search" + atributos (índice numérico) + lo que necesita la sincronización incremental
+    "catalog": _SUMMARY_FIELDS + (
+        "short_description",
+        "categories",
+        "attributes",
+        "manage_stock",
+        "type",
+        "status",
+        "date_modified_gmt",
+    ),
+    # SKU directo (conversation paso 5) y get_stock_by_sku
+    "sku": _SUMMARY_FIELDS + ("manage_stock", "type"),
+    # refresco liviano de stock/precio de un producto ya cacheado
+    "stock": (
+        "id",
+        "price",
+        "regular_price",
+        "stock_status",
+        "stock_quantity",
+        "manage_stock",
+        "status",
+    ),
+    # catalog_cache: índice de variaciones de productos variables (stock por voltaje, tamaño, ...)
+    "variation": (
+        "id",
+        "parent_id",
+        "sku",
+        "price",
+        "regular_price",
+        "stock_status",
+        "stock_quantity",
+        "manage_stock",
+        "attributes",
+        "status",
+    ),
+}
+
+# Árbol de categorías (category_tree): lo mínimo para ancestros, slugs y búsqueda por nombre.
+CATEGORY_FIELDS: Tuple[str, ...] = ("id", "name", "slug", "parent", "count")
+
+
+def product_fields(path: str) -> str:
+    """
+    Valor del parámetro `_fields` para una ruta de código de PRODUCT_FIELDS.
+    """
+    return ",".join(PRODUCT_FIELDS[path])
+
+
+def project_product(product: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """
+    Recorta localmente un producto completo (p. ej. el payload de un webhook)
+    a los campos de una ruta de PRODUCT_FIELDS.
+    """
+    return {k: product[k] for k in PRODUCT_FIELDS[path] if k in product}
+
+
+# Clave de single-flight: (upstream, timeout explícito, path, params ordenados).
+_InflightKey = Tuple[str, Optional[float], str, Tuple[Tuple[str, str], ...]]
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Clave de cache para ?search=: minúsculas y espacios colapsados.
+    """
+    return " ".join((query or "").lower().split())
+
+
+def stock_summary(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resumen de inventario de un producto (forma de respuesta de get_stock_by_sku).
+    """
+    return {
+        "id": product.get("id"),
+        "name": product.get("name"),
+        "sku": product.get("sku"),
+        "manage_stock": product.get("manage_stock"),
+        "stock_quantity": product.get("stock_quantity"),
+        "stock_status": product.get("stock_status"),
+        "type": product.get("type"),
+    }
+
+
+def _header_int(response: httpx.Response, name: str) -> Optional[int]:
+    raw = response.headers.get(name)
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return None
+
 
 class WooCommerceClient:
     """
@@ -23,7 +138,78 @@ class WooCommerceClient:
         self.api_base = f"{base_url}/wp-json/wc/v3"
         self.consumer_key = settings.WOOCOMMERCE_CONSUMER_KEY
         self.consumer_secret = settings.WOOCOMMERCE_CONSUMER_SECRET
-        self.timeout = 10.0
+        self.timeout = float(settings.WOOCOMMERCE_TIMEOUT_SECONDS)
+        self.connect_timeout = float(settings.WOOCOMMERCE_CONNECT_TIMEOUT_SECONDS)
+        # Cliente HTTP compartido (pool keep-alive). Lo abre/cierra el ciclo de vida de la app.
+        self._http: Optional[httpx.AsyncClient] = None
+        # Single-flight: GETs idénticos concurrentes comparten una sola llamada al upstream.
+        self._inflight: Dict[_InflightKey, "asyncio.Task[httpx.Response]"] = {}
+        self._inflight_waiters: Dict["asyncio.Task[httpx.Response]", int] = {}
+        self._upstream_requests = 0
+        self._coalesced_requests = 0
+        self._abandoned_requests = 0
+        # Resultados de ?search= por query normalizada; se vacía con cada generación del catálogo.
+        self.search_cache = TTLCache(
+            maxsize=int(settings.WOOCOMMERCE_SEARCH_CACHE_MAX_ENTRIES),
+            ttl_seconds=float(settings.WOOCOMMERCE_SEARCH_CACHE_TTL_SECONDS),
+        )
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        http2 = bool(settings.WOOCOMMERCE_HTTP2)
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("WOOCOMMERCE_HTTP2 activo pero falta el paquete 'h2'; se usa HTTP/1.1")
+                http2 = False
+
+        limits = httpx.Limits(
+            max_connections=int(settings.WOOCOMMERCE_MAX_CONNECTIONS),
+            max_keepalive_connections=int(settings.WOOCOMMERCE_MAX_KEEPALIVE_CONNECTIONS),
+            keepalive_expiry=float(settings.WOOCOMMERCE_KEEPALIVE_EXPIRY_SECONDS),
+        )
+        timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """
+        Cliente HTTP compartido hacia la tienda.
+
+        Si la app no lo abrió (scripts, consola), se crea bajo demanda.
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = self._build_http_client()
+        return self._http
+
+    async def startup(self) -> None:
+        """
+        Abre el pool de conexiones. Se llama desde el hook de startup de FastAPI.
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = self._build_http_client()
+
+    async def aclose(self) -> None:
+        """
+        Cierra el pool de conexiones. Se llama desde el hook de shutdown de FastAPI.
+        """
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    def request_stats(self) -> Dict[str, int]:
+        """
+        Métricas de single-flight: llamadas reales a Woo vs. peticiones que se
+        resolvieron reutilizando una llamada idéntica ya en vuelo, y llamadas
+        canceladas porque ya nadie esperaba su respuesta.
+        """
+        return {
+            "upstream_requests": self._upstream_requests,
+            "coalesced_requests": self._coalesced_requests,
+            "abandoned_requests": self._abandoned_requests,
+            "inflight_requests": len(self._inflight),
+            "search_cache": self.search_cache.stats(),
+        }
 
     async def _request(
         self,
@@ -32,15 +218,81 @@ class WooCommerceClient:
         *,
         params: Optional[Dict[str, Any]] = None,
         json: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        upstream: str = "woocommerce",
     ) -> httpx.Response:
         """
         Método interno para hacer peticiones a WooCommerce.
 
         - Añade consumer_key y consumer_secret a los params.
+        - Reutiliza el pool compartido; `timeout` permite ajustar el límite por petición.
+        - `upstream` elige el breaker: "woocommerce" (chat) o "woocommerce_bulk" (crawls).
+        - Los GET idénticos concurrentes (mismo upstream y timeout) se agrupan
+          (single-flight): todos reciben la misma respuesta de una única llamada.
+          La llamada compartida corre sin el presupuesto de tiempo del primer
+          llamador; cada uno espera como mucho lo que le queda del suyo.
         - Lanza httpx.HTTPStatusError si Woo responde 4xx/5xx.
         """
-        if params is None:
-            params = {}
+        if method.upper() != "GET" or json is not None:
+            return await self._send(method, path, params=params, json=json, timeout=timeout, upstream=upstream)
+
+        key = (upstream, timeout, path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            with without_deadline():
+                # La tarea copia el contexto al crearse: así no hereda el deadline de este llamador.
+                task = asyncio.ensure_future(
+                    self._send(method, path, params=params, timeout=timeout, upstream=upstream)
+                )
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish_inflight(key, t))
+        else:
+            self._coalesced_requests += 1
+        # shield: si un llamador se cancela (wait_for), la llamada compartida sigue para los
+        # demás; cuando se va el último, se cancela también (con sus reintentos y backoff).
+        self._inflight_waiters[task] = self._inflight_waiters.get(task, 0) + 1
+        try:
+            budget = remaining_budget()
+            if budget is None:
+                return await asyncio.shield(task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), timeout=max(0.0, budget))
+            except asyncio.TimeoutError:
+                if task.done():
+                    raise
+                raise TimeoutError(f"Sin presupuesto de tiempo para esperar a {upstream}") from None
+        finally:
+            left = self._inflight_waiters[task] - 1
+            if left:
+                self._inflight_waiters[task] = left
+            else:
+                del self._inflight_waiters[task]
+                if not task.done():
+                    self._abandoned_requests += 1
+                    # Se saca ya del mapa: un GET igual que llegue antes del done-callback
+                    # debe abrir una llamada nueva, no sumarse a la que se está cancelando.
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def _finish_inflight(self, key: _InflightKey, task: "asyncio.Task[httpx.Response]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marca la excepción como recuperada aunque todos los llamadores se hayan cancelado.
+            task.exception()
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        upstream: str = "woocommerce",
+    ) -> httpx.Response:
+        params = dict(params or {})
 
         # Auth por query string
         params.update(
@@ -52,29 +304,35 @@ class WooCommerceClient:
 
         url = f"{self.api_base}{path}"
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.request(
+        async def _do(adaptive_timeout: float) -> httpx.Response:
+            # Timeout explícito del llamador o el adaptativo del breaker del upstream.
+            limit = timeout if timeout is not None else adaptive_timeout
+            self._upstream_requests += 1
+            response = await self.http.request(
                 method=method,
                 url=url,
                 params=params,
                 json=json,
+                timeout=httpx.Timeout(limit, connect=min(self.connect_timeout, limit)),
             )
 
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError:
-            logger.error(
-                "Error en petición a WooCommerce",
-                extra={
-                    "method": method,
-                    "url": url,
-                    "status_code": response.status_code,
-                    "response_text": response.text,
-                },
-            )
-            raise
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                logger.error(
+                    "Error en petición a WooCommerce",
+                    extra={
+                        "method": method,
+                        "url": url,
+                        "status_code": response.status_code,
+                        "response_text": response.text,
+                    },
+                )
+                raise
 
-        return response
+            return response
+
+        return await call_upstream(upstream, _do)
 
     async def get_products_by_sku(self, sku: str) -> List[Dict[str, Any]]:
         """
@@ -85,7 +343,7 @@ class WooCommerceClient:
         response = await self._request(
             "GET",
             "/products",
-            params={"sku": sku},
+            params={"sku": sku, "_fields": product_fields("sku")},
         )
         data = response.json()
         if not isinstance(data, list):
@@ -102,12 +360,22 @@ class WooCommerceClient:
             return None
         return products[0]
 
-    async def get_product_by_id(self, product_id: int) -> Optional[Dict[str, Any]]:
+    async def get_product_by_id(
+        self,
+        product_id: int,
+        *,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
         """
         Obtiene un producto por ID: GET /products/{id}
+
+        `fields` limita la respuesta (proyección `_fields=`); por defecto trae el objeto completo.
         """
+        params: Dict[str, Any] = {}
+        if fields:
+            params["_fields"] = ",".join(fields)
         try:
-            response = await self._request("GET", f"/products/{int(product_id)}")
+            response = await self._request("GET", f"/products/{int(product_id)}", params=params)
         except Exception:
             return None
 
@@ -123,22 +391,39 @@ class WooCommerceClient:
     async def search_products(self, query: str, per_page: int = 10) -> List[Dict[str, Any]]:
         """
         Busca productos por texto (nombre, descripción, etc.) usando ?search=.
+
+        Las respuestas se cachean (TTL + LRU) por query normalizada y per_page.
         """
+        cache_key = ("search_products", normalize_search_query(query), per_page)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
         response = await self._request(
             "GET",
             "/products",
-            params={"search": query, "per_page": per_page, "status": "publish"},
+            params={
+                "search": query,
+                "per_page": per_page,
+                "status": "publish",
+                "_fields": product_fields("search"),
+            },
         )
         data = response.json()
         if not isinstance(data, list):
             logger.warning("Respuesta inesperada de WooCommerce /products search", extra={"data": data})
             return []
-        return data
+        self.search_cache.set(cache_key, data)
+        return list(data)
 
     async def search_categories(self, query: str, per_page: int = 20) -> List[Dict[str, Any]]:
         """
         Busca categorías por nombre: /products/categories?search=
+
+        Si el árbol de categorías ya está cargado en memoria, se resuelve localmente.
         """
+        if category_tree.loaded:
+            return category_tree.search(query, limit=per_page)
         response = await self._request(
             "GET",
             "/products/categories",
@@ -156,7 +441,12 @@ class WooCommerceClient:
     async def list_categories(self, parent: Optional[int] = None, per_page: int = 100) -> List[Dict[str, Any]]:
         """
         Lista categorías (útil para traer hijos con parent=ID).
+
+        Si el árbol de categorías ya está cargado en memoria, se resuelve localmente.
         """
+        if category_tree.loaded:
+            nodes = category_tree.all() if parent is None else category_tree.children(int(parent))
+            return nodes[:per_page]
         params: Dict[str, Any] = {"per_page": per_page}
         if parent is not None:
             params["parent"] = int(parent)
@@ -168,11 +458,46 @@ class WooCommerceClient:
             return []
         return data
 
+    async def list_categories_page(
+        self,
+        per_page: int = 100,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[int]]:
+        """
+        Una página del árbol completo de categorías (siempre contra la API),
+        con los headers de paginación. Lo usa catalog_cache para cargar category_tree.
+        """
+        response = await self._request(
+            "GET",
+            "/products/categories",
+            params={"per_page": per_page, "page": page, "_fields": ",".join(CATEGORY_FIELDS)},
+            upstream=_BULK_UPSTREAM,
+        )
+        data = response.json()
+        total = _header_int(response, "X-WP-Total")
+        total_pages = _header_int(response, "X-WP-TotalPages")
+        if not isinstance(data, list):
+            logger.warning("Respuesta inesperada de WooCommerce /products/categories page", extra={"data": data})
+            return [], total, total_pages
+        return data, total, total_pages
+
     async def list_products(self, per_page: int = 100, page: int = 1) -> List[Dict[str, Any]]:
         """
         Lista productos publicados. Útil para construir un catálogo local en memoria
         y hacer búsqueda/ranking cuando ?search= no devuelve coincidencias.
         """
+        products, _, _ = await self.list_products_page(per_page=per_page, page=page)
+        return products
+
+    async def list_products_page(
+        self,
+        per_page: int = 100,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[int]]:
+        """
+        Igual que list_products, pero devuelve también los headers de paginación:
+        (productos, X-WP-Total, X-WP-TotalPages). Los totales son None si Woo no los envía.
+        """
         response = await self._request(
             "GET",
             "/products",
@@ -182,12 +507,173 @@ class WooCommerceClient:
                 "status": "publish",
                 "orderby": "date",
                 "order": "desc",
+                "_fields": product_fields("catalog"),
             },
+            upstream=_BULK_UPSTREAM,
         )
         data = response.json()
+        total = _header_int(response, "X-WP-Total")
+        total_pages = _header_int(response, "X-WP-TotalPages")
         if not isinstance(data, list):
             logger.warning("Respuesta inesperada de WooCommerce /products list", extra={"data": data})
-            return []
+            return [], total, total_pages
+        return data, total, total_pages
+
+    async def list_modified_products_page(
+        self,
+        modified_after: str,
+        per_page: int = 100,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[int]]:
+        """
+        Productos modificados después de `modified_after` (ISO 8601, GMT), en cualquier estado.
+
+        Se usa para la sincronización incremental del catálogo: incluye productos que pasaron
+        a borrador/privado para poder retirarlos del cache local.
+        """
+        response = await self._request(
+            "GET",
+            "/products",
+            params={
+                "per_page": per_page,
+                "page": page,
+                "status": "any",
+                "modified_after": modified_after,
+                "dates_are_gmt": "true",
+                "_fields": product_fields("catalog"),
+            },
+            upstream=_BULK_UPSTREAM,
+        )
+        data = response.json()
+        total = _header_int(response, "X-WP-Total")
+        total_pages = _header_int(response, "X-WP-TotalPages")
+        if not isinstance(data, list):
+            logger.warning("Respuesta inesperada de WooCommerce /products modified", extra={"data": data})
+            return [], total, total_pages
+        return data, total, total_pages
+
+    async def iter_catalog(
+        self,
+        *,
+        per_page: int = 100,
+        max_pages: int = 30,
+        concurrency: int = 4,
+        modified_after: Optional[str] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Recorre el catálogo página por página (proyección "catalog").
+
+        La primera página trae X-WP-TotalPages; el resto se pide en paralelo (hasta
+        `concurrency` en vuelo) y cada página se entrega apenas llega, en el orden en
+        que terminan. Así el consumidor indexa mientras siguen llegando páginas, sin
+        juntar el catálogo crudo completo en memoria.
+
+        Con `modified_after` recorre solo lo modificado desde esa fecha (cualquier estado).
+        """
+
+        async def _page(page: int) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[int]]:
+            if modified_after is None:
+                return await self.list_products_page(per_page=per_page, page=page)
+            return await self.list_modified_products_page(modified_after, per_page=per_page, page=page)
+
+        first, _, total_pages = await _page(1)
+        if not first:
+            return
+        first_full = len(first) >= per_page
+        yield first
+        del first
+        if not first_full:
+            return
+
+        if total_pages is None:
+            # Sin X-WP-TotalPages: se pagina en serie hasta una página incompleta.
+            page = 2
+            while page <= max_pages:
+                batch, _, _ = await _page(page)
+                if not batch:
+                    return
+                full = len(batch) >= per_page
+                yield batch
+                if not full:
+                    return
+                page += 1
+            return
+
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def _bounded(page: int) -> List[Dict[str, Any]]:
+            async with sem:
+                batch, _, _ = await _page(page)
+                return batch
+
+        tasks = [asyncio.ensure_future(_bounded(page)) for page in range(2, min(total_pages, max_pages) + 1)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def list_variations_page(
+        self,
+        product_id: int,
+        per_page: int = 100,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[int]]:
+        """
+        Una página de variaciones de un producto variable (proyección "variation").
+        """
+        response = await self._request(
+            "GET",
+            f"/products/{product_id}/variations",
+            params={
+                "per_page": per_page,
+                "page": page,
+                "_fields": product_fields("variation"),
+            },
+            upstream=_BULK_UPSTREAM,
+        )
+        data = response.json()
+        total = _header_int(response, "X-WP-Total")
+        total_pages = _header_int(response, "X-WP-TotalPages")
+        if not isinstance(data, list):
+            logger.warning(
+                "Respuesta inesperada de WooCommerce /variations",
+                extra={"product_id": product_id, "data": data},
+            )
+            return [], total, total_pages
+        return data, total, total_pages
+
+    async def get_variation(
+        self,
+        product_id: int,
+        variation_id: int,
+        *,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Una variación puntual: GET /products/{id}/variations/{variation_id}
+
+        `fields` limita la respuesta; por defecto usa la proyección "variation".
+        """
+        params = {"_fields": ",".join(fields or PRODUCT_FIELDS["variation"])}
+        try:
+            response = await self._request(
+                "GET",
+                f"/products/{int(product_id)}/variations/{int(variation_id)}",
+                params=params,
+            )
+        except Exception:
+            return None
+
+        data = response.json()
+        if not isinstance(data, dict):
+            logger.warning(
+                "Respuesta inesperada de WooCommerce /variations/{id}",
+                extra={"data": data},
+            )
+            return None
         return data
 
     async def list_recent_products(self, per_page: int = 50) -> List[Dict[str, Any]]:
@@ -202,6 +688,7 @@ class WooCommerceClient:
                 "orderby": "date",
                 "order": "desc",
                 "status": "publish",
+                "_fields": product_fields("search"),
             },
         )
         data = response.json()
@@ -224,21 +711,14 @@ class WooCommerceClient:
           "type": "simple" | "variable" | ...
         }
 
-        Para productos variables, esta función NO desglosa variaciones.
+        Para productos variables, esta función NO desglosa variaciones
+        (catalog_cache.lookup_stock_by_sku sí, con el índice local de variaciones).
         """
         product = await self.get_product_by_sku(sku)
         if product is None:
             return None
 
-        return {
-            "id": product.get("id"),
-            "name": product.get("name"),
-            "sku": product.get("sku"),
-            "manage_stock": product.get("manage_stock"),
-            "stock_quantity": product.get("stock_quantity"),
-            "stock_status": product.get("stock_status"),
-            "type": product.get("type"),
-        }
+        return stock_summary(product)
 
 
 woocommerce_client = WooCommerceClient()
@@ -5,15 +5,17 @@ from urllib.parse import urljoin
 import httpx
 
 from app.core.settings import get_settings
+from app.services.category_tree import category_tree
+from app.services.resilience import call_upstream
+from app.services.woocommerce import product_fields, woocommerce_client
 
 settings = get_settings()
-_CATEGORY_CACHE: Dict[str, int] = {}
 
 def _get_env(name: str) -> str:
     v = getattr(settings, name, None) or os.getenv(name)
     if not v:
         raise RuntimeError(f"Missing env var: {name}")
-    return v
+    return str(v)
 
 
 def _woo_base_products_url(base_url: str) -> str:
@@ -30,12 +32,22 @@ def _woo_base_categories_url(base_url: str) -> str:
     return urljoin(base, "wp-json/wc/v3/products/categories")
 
 
+async def _get(url: str, params: Dict[str, Any], timeout: float) -> httpx.Response:
+    r = await woocommerce_client.http.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r
+
+
 async def _get_category_id_by_slug(slug: str) -> Optional[int]:
+    """
+    Resuelve el slug con el árbol de categorías en memoria; solo si aún no se
+    cargó (arranque en frío) se consulta la API.
+    """
     slug = (slug or "").strip()
     if not slug:
         return None
-    if slug in _CATEGORY_CACHE:
-        return _CATEGORY_CACHE[slug]
+    if category_tree.loaded:
+        return category_tree.id_for_slug(slug)
 
     base_url = _get_env("WOOCOMMERCE_BASE_URL")
     ck = _get_env("WOOCOMMERCE_CONSUMER_KEY")
@@ -49,15 +61,12 @@ async def _get_category_id_by_slug(slug: str) -> Optional[int]:
         "consumer_secret": cs,
     }
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
+    r = await call_upstream("woocommerce", lambda timeout: _get(url, params, timeout))
+    data = r.json()
 
     if isinstance(data, list) and data:
         cat_id = data[0].get("id")
         if isinstance(cat_id, int):
-            _CATEGORY_CACHE[slug] = cat_id
             return cat_id
     return None
 
@@ -80,6 +89,7 @@ async def search_products_by_text(
     params = {
         "per_page": per_page,
         "status": "publish",
+        "_fields": product_fields("search"),
         # Auth por query-string (como ya lo tienes en tu cliente actual)
         "consumer_key": ck,
         "consumer_secret": cs,
@@ -91,10 +101,8 @@ async def search_products_by_text(
         if cat_id:
             params["category"] = cat_id
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
+    r = await call_upstream("woocommerce", lambda timeout: _get(url, params, timeout))
+    data = r.json()
 
     if not isinstance(data, list):
         return []
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Autómata multi-patrón (Aho-Corasick) sobre caracteres.
+
+    Se compila una vez con todos los patrones y luego encuentra todas sus
+    apariciones en un texto con una sola pasada lineal, sin importar cuántos
+    patrones haya. Los patrones se identifican por su posición en la lista.
+    """
+
+    def __init__(self, patterns: Sequence[str]) -> None:
+        self.patterns: Tuple[str, ...] = tuple(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        outputs: List[List[int]] = [[]]
+        for idx, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                node = nxt
+            outputs[node].append(idx)
+
+        # BFS: el fallo de cada nodo es el sufijo propio más largo que también es prefijo.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                outputs[nxt].extend(outputs[self._fail[nxt]])
+
+        self._out = [tuple(o) for o in outputs]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Genera (posición_final, índice_de_patrón) por cada aparición, en orden.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                yield pos, idx
+
+    def find_all(self, text: str) -> Set[int]:
+        """
+        Índices de los patrones que aparecen al menos una vez en `text`.
+        """
+        return {idx for _, idx in self.iter_matches(text)}
+
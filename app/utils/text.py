@@ -0,0 +1,177 @@
+"""
+Análisis de texto en español compartido por el catálogo, la base de
+conocimiento y los routers de intención.
+
+- fold: minúsculas, sin tildes y espacios colapsados (conserva puntuación).
+- normalize: como fold pero la puntuación pasa a espacio.
+- tokenize: tokens alfanuméricos de `normalize`.
+- stem: stemmer ligero (plurales y -ación, vocal final) para que
+  piscina/piscinas o filtro/filtros/filtración caigan en la misma raíz.
+- analyze: raíces de `tokenize`.
+- STOPWORDS: palabras vacías compartidas por la búsqueda y la KB.
+
+Las variantes cacheadas (lru_cache) son para mensajes y consultas: el mismo
+texto pasa por varios routers dentro de un turno y se procesa una sola vez.
+Para indexar documentos largos usar `analyze_document`, que no llena el cache.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+_PUNCT_RE = re.compile(r"[^a-z0-9\s]")
+_SPACES_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_VOWELS = frozenset("aeiou")
+_PLURAL_ES_AFTER = frozenset("lrndzj")  # motor-es, unidad-es, filtracion-es
+_MIN_STEM_LEN = 4
+
+# Palabras vacías de los mensajes de clientes (saludos, artículos, "necesito", "quiero"...).
+STOPWORDS = frozenset(
+    {
+        "a",
+        "al",
+        "algo",
+        "alguien",
+        "as",
+        "con",
+        "como",
+        "cual",
+        "cuando",
+        "de",
+        "del",
+        "donde",
+        "el",
+        "ella",
+        "ellos",
+        "en",
+        "es",
+        "esta",
+        "estoy",
+        "fue",
+        "ha",
+        "hola",
+        "las",
+        "lo",
+        "los",
+        "la",
+        "me",
+        "mi",
+        "mis",
+        "necesito",
+        "quiero",
+        "que",
+        "para",
+        "por",
+        "ser",
+        "si",
+        "sin",
+        "su",
+        "sus",
+        "una",
+        "un",
+        "unos",
+        "unas",
+        "y",
+        "o",
+    }
+)
+
+
+def _fold(text: Optional[str]) -> str:
+    t = (text or "").strip().lower()
+    t = "".join(
+        ch for ch in unicodedata.normalize("NFD", t)
+        if unicodedata.category(ch) != "Mn"
+    )
+    return _SPACES_RE.sub(" ", t)
+
+
+def _normalize(text: Optional[str]) -> str:
+    t = _PUNCT_RE.sub(" ", _fold(text))
+    return _SPACES_RE.sub(" ", t).strip()
+
+
+def _tokenize(text: Optional[str], min_len: int) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(_normalize(text)) if len(t) >= min_len]
+
+
+@lru_cache(maxsize=4096)
+def fold(text: Optional[str]) -> str:
+    return _fold(text)
+
+
+@lru_cache(maxsize=4096)
+def normalize(text: Optional[str]) -> str:
+    return _normalize(text)
+
+
+@lru_cache(maxsize=4096)
+def tokenize(text: Optional[str], min_len: int = 3) -> Tuple[str, ...]:
+    return tuple(_tokenize(text, min_len))
+
+
+@lru_cache(maxsize=32768)
+def stem(word: str) -> str:
+    """
+    Raíz aproximada de una palabra ya normalizada (sin tildes, minúsculas).
+
+    No es un stemmer completo: solo quita plurales, el sufijo -acion y la vocal
+    final, que es lo que separa las variantes habituales en las consultas
+    (bomba/bombas -> bomb, filtro/filtros/filtracion -> filtr). Números y
+    palabras cortas (ph, uv, agua) se devuelven tal cual.
+    """
+    w = word
+    if len(w) <= _MIN_STEM_LEN or not w.isalpha():
+        return w
+
+    # plurales
+    if w.endswith("ces"):
+        w = w[:-3] + "z"
+    elif w.endswith("es") and w[-3] in _PLURAL_ES_AFTER:
+        w = w[:-2]
+    elif w.endswith("s") and w[-2] in _VOWELS:
+        w = w[:-1]
+
+    # derivación: filtracion -> filtr, dosificacion -> dosific
+    if w.endswith("acion") and len(w) - 5 >= _MIN_STEM_LEN:
+        return w[:-5]
+
+    # vocal final: piscina -> piscin, filtro -> filtr
+    if len(w) > _MIN_STEM_LEN and w[-1] in _VOWELS:
+        w = w[:-1]
+    return w
+
+
+@lru_cache(maxsize=4096)
+def analyze(text: Optional[str], min_len: int = 3) -> Tuple[str, ...]:
+    """
+    Raíces de los tokens de un mensaje o consulta (cacheado por texto).
+    """
+    return tuple(stem(t) for t in tokenize(text, min_len))
+
+
+def analyze_document(text: Optional[str], min_len: int = 3) -> List[str]:
+    """
+    Igual que `analyze` pero sin cachear el texto (para indexar catálogos o KB).
+    """
+    return [stem(t) for t in _tokenize(text, min_len)]
+
+
+def stem_all(words: Iterable[str]) -> List[str]:
+    """
+    Raíces de palabras sueltas (normalizándolas), sin duplicados y en orden.
+    """
+    seen = set()
+    out: List[str] = []
+    for w in words:
+        for t in tokenize(w, 1):
+            s = stem(t)
+            if s not in seen:
+                seen.add(s)
+                out.append(s)
+    return out
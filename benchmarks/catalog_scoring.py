@@ -0,0 +1,126 @@
+"""
+Compara el ranking del catálogo local: recorrido del índice invertido
+(InvertedIndex.score + sort) contra la matriz dispersa (CatalogMatrix.score +
+np.partition), con catálogos sintéticos de 1k/10k/100k productos.
+
+Uso (requiere numpy y scipy):
+
+    PYTHONPATH=. python benchmarks/catalog_scoring.py [--sizes 1000 10000 100000] [--queries 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import math
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from app.services.catalog_index import CatalogProduct, InvertedIndex
+from app.services.catalog_matrix import MATRIX_AVAILABLE, CatalogMatrix
+
+_VOCABULARY = 20000
+_CATEGORIES = 60
+_TOP_K = 50
+
+
+def _zipf_sampler(rng: random.Random, n: int, s: float = 1.1):
+    cum_weights = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+    words = [f"t{i}" for i in range(n)]
+
+    def sample(k: int) -> List[str]:
+        return rng.choices(words, cum_weights=cum_weights, k=k)
+
+    return sample
+
+
+def _synthetic_catalog(size: int, seed: int) -> Tuple[InvertedIndex, Dict[int, CatalogProduct], List[List[str]]]:
+    rng = random.Random(seed)
+    sample = _zipf_sampler(rng, _VOCABULARY)
+    index = InvertedIndex()
+    products: Dict[int, CatalogProduct] = {}
+    for pid in range(1, size + 1):
+        cid = rng.randrange(1, _CATEGORIES + 1)
+        index.add(
+            pid,
+            {
+                "name": sample(rng.randint(3, 8)),
+                "categories": [f"c{cid}"],
+                "short_description": sample(rng.randint(10, 40)),
+            },
+        )
+        products[pid] = CatalogProduct.from_dict(
+            {"id": pid, "name": f"producto {pid}", "categories": [{"id": cid, "name": f"c{cid}", "slug": f"c{cid}"}]}
+        )
+    queries = [sample(rng.randint(1, 3)) for _ in range(512)]
+    return index, products, queries
+
+
+def _loop_top_k(index: InvertedIndex, tokens: List[str]) -> List[Tuple[int, float]]:
+    scores = index.score(tokens)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:_TOP_K]
+
+
+def _matrix_top_k(matrix: CatalogMatrix, tokens: List[str]) -> List[Tuple[int, float]]:
+    scores = matrix.score(tokens)
+    return matrix.top_k(scores, scores > 0, _TOP_K)
+
+
+def _timed(fn, queries: List[List[str]]) -> List[float]:
+    out: List[float] = []
+    for tokens in queries:
+        start = time.perf_counter()
+        fn(tokens)
+        out.append((time.perf_counter() - start) * 1000.0)
+    return out
+
+
+def _summary(samples: List[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50 {statistics.median(samples):8.3f} ms  p95 {p95:8.3f} ms"
+
+
+def run(size: int, n_queries: int, seed: int) -> None:
+    start = time.perf_counter()
+    index, products, queries = _synthetic_catalog(size, seed)
+    index_s = time.perf_counter() - start
+    start = time.perf_counter()
+    matrix = CatalogMatrix.build(index, products, generation=0)
+    matrix_s = time.perf_counter() - start
+    queries = queries[:n_queries]
+
+    # Mismos scores en el top (los empates pueden ordenar ids distintos; la matriz es float32).
+    mismatches = 0
+    for tokens in queries:
+        a = [s for _, s in _loop_top_k(index, tokens)]
+        b = [s for _, s in _matrix_top_k(matrix, tokens)]
+        if len(a) != len(b) or not all(math.isclose(x, y, rel_tol=1e-4) for x, y in zip(a, b)):
+            mismatches += 1
+
+    loop = _timed(lambda t: _loop_top_k(index, t), queries)
+    vect = _timed(lambda t: _matrix_top_k(matrix, t), queries)
+    print(f"\n{size:,} productos ({matrix.matrix.nnz:,} pares producto-token, {len(matrix.columns):,} tokens)")
+    print(f"  build índice : {index_s:8.2f} s   build matriz: {matrix_s:8.2f} s")
+    print(f"  índice (loop): {_summary(loop)}")
+    print(f"  matriz       : {_summary(vect)}")
+    print(f"  speedup p50  : {statistics.median(loop) / max(statistics.median(vect), 1e-9):.1f}x   "
+          f"consultas con top distinto: {mismatches}/{len(queries)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if not MATRIX_AVAILABLE:
+        raise SystemExit("numpy y scipy no están instalados: pip install numpy scipy")
+    for size in args.sizes:
+        run(size, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()